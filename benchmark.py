@@ -0,0 +1,481 @@
+"""End-to-end load and latency benchmark for the chat relay.
+Runs ChatRelay with stand-in Discord and Matrix bridges, drives ingress
+through real HTTP posts and SCTP datagrams, polls GET /messages and
+reports throughput and ingress to delivery latency as JSON.
+
+Example:
+    python benchmark.py --duration 30 --http-senders 50 --sctp-senders 10 \
+        --pollers 20 --send-latency 0.05 --output bench_output.txt
+
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import socket
+import subprocess
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import aiohttp
+
+import config
+from message_buffer import Message
+from rate_limit import TokenBucket
+
+
+def percentiles(samples: list[float]) -> dict[str, float | None]:
+    """p50, p99 and max of latency samples in milliseconds."""
+    if not samples:
+        return {"p50": None, "p99": None, "max": None}
+
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(p * len(ordered)) - 1))
+        return round(ordered[index] * 1000, 3)
+
+    return {"p50": rank(0.50), "p99": rank(0.99), "max": rank(1.0)}
+
+
+class Recorder:
+    """Send and receive times of benchmark messages, keyed by content."""
+
+    def __init__(self) -> None:
+        # Content -> perf_counter time the message was handed to the relay
+        self.sent: dict[str, float] = {}
+        self.sent_by: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        # Destination -> contents delivered and their latencies
+        self.delivered: dict[str, set[str]] = {}
+        self.delivery_latency: dict[str, list[float]] = {}
+        self.poll_latency: list[float] = []
+        self.poll_seconds: list[float] = []
+        self.polled = 0
+
+    def record_sent(self, kind: str, content: str, started: float) -> None:
+        """Record a message accepted by the relay ingress."""
+        self.sent[content] = started
+        self.sent_by[kind] += 1
+
+    def discard(self, kind: str, content: str) -> None:
+        """Forget a message the relay did not accept."""
+        del self.sent[content]
+        self.sent_by[kind] -= 1
+
+    def record_delivery(self, destination: str, content: str) -> None:
+        """Record a message reaching a stand-in bridge."""
+        started = self.sent.get(content)
+        delivered = self.delivered.setdefault(destination, set())
+        if started is None or content in delivered:
+            return
+        delivered.add(content)
+        self.delivery_latency.setdefault(destination, []).append(
+            time.perf_counter() - started,
+        )
+
+    def record_poll(self, messages: list[Message], elapsed: float) -> None:
+        """Record one GET /messages response."""
+        now = time.perf_counter()
+        self.polled += 1
+        self.poll_seconds.append(elapsed)
+        for message in messages:
+            started = self.sent.get(message["content"])
+            if started is not None:
+                self.poll_latency.append(now - started)
+
+    def undelivered(self, destinations: list[str]) -> int:
+        """Messages sent but not yet delivered to every destination."""
+        return sum(
+            len(self.sent) - len(self.delivered.get(name, ()))
+            for name in destinations
+        )
+
+
+class FakeBridge:
+    """Stand-in for a chat platform bridge with configurable behavior.
+
+    Each send waits for the send latency, then fails with the configured
+    probability. With a rate set, sends are paced by a token bucket the
+    way the real bridges pace platform API calls.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        recorder: Recorder,
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        rate: float = 0.0,
+        burst: int = 1,
+    ) -> None:
+        """Initialize the stand-in bridge.
+
+        Args:
+            name: Destination name used in routes
+            recorder: Recorder notified of delivered messages
+            latency: Seconds each platform send takes
+            failure_rate: Probability a send fails and is retried
+            rate: Sends per second, 0 for unlimited
+            burst: Sends allowed back to back before rate limiting
+
+        """
+        self.name = name
+        self.recorder = recorder
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.sends = 0
+
+    async def start(self) -> None:
+        """Nothing to connect to."""
+
+    async def stop(self) -> None:
+        """Nothing to disconnect from."""
+
+    def coalesce_delay(self, pending: int) -> float:
+        """Send batches as soon as they are queued."""
+        return 0.0
+
+    async def post_message(self, sender: str, platform: str, content: str) -> bool:
+        """Deliver a single message."""
+        await self._send()
+        self.recorder.record_delivery(self.name, content)
+        return True
+
+    async def post_messages(self, messages: list[Message]) -> int:
+        """Deliver a batch of messages as one platform send."""
+        await self._send()
+        for message in messages:
+            self.recorder.record_delivery(self.name, message["content"])
+        return len(messages)
+
+    async def _send(self) -> None:
+        """Simulate one platform API call."""
+        if self._bucket is not None:
+            await self._bucket.acquire()
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        self.sends += 1
+        if random.random() < self.failure_rate:
+            raise ConnectionError(f"Simulated {self.name} send failure")
+
+
+async def _paced(
+    rate: float,
+    duration: float,
+    send: Callable[[int], Awaitable[None]],
+) -> None:
+    """Call send(n) open loop at a fixed rate, without waiting for replies."""
+    tasks: set[asyncio.Task] = set()
+    started = time.perf_counter()
+    n = 0
+    while True:
+        due = started + n / rate
+        if due - started >= duration:
+            break
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        task = asyncio.create_task(send(n))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        n += 1
+
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+async def http_sender(
+    session: aiohttp.ClientSession,
+    url: str,
+    recorder: Recorder,
+    index: int,
+    args: argparse.Namespace,
+) -> None:
+    """Post messages from one game server sender at the configured rate."""
+    server = f"bench-http-{index % args.servers}"
+
+    async def send(n: int) -> None:
+        content = f"http-{index}-{n}"
+        payload = {
+            "user": f"player{index}",
+            "message": content,
+            "server": server,
+            "id": content,
+        }
+        # Recorded first, the relay may deliver before the response is read
+        recorder.record_sent("http", content, time.perf_counter())
+        try:
+            async with session.post(url, json=payload) as response:
+                if response.status != 200:
+                    recorder.errors[f"http_{response.status}"] += 1
+                    recorder.discard("http", content)
+        except aiohttp.ClientError:
+            recorder.errors["http_client"] += 1
+            recorder.discard("http", content)
+
+    await _paced(args.rate, args.duration, send)
+
+
+async def sctp_sender(recorder: Recorder, index: int, args: argparse.Namespace) -> None:
+    """Send SCTP datagrams from one game server sender at the configured rate."""
+    import sctp
+
+    loop = asyncio.get_running_loop()
+    sock = sctp.sctpsocket_udp(socket.AF_INET)
+    server = f"bench-sctp-{index % args.servers}"
+
+    async def send(n: int) -> None:
+        content = f"sctp-{index}-{n}"
+        line = json.dumps(
+            {
+                "user": f"player{index}",
+                "platform": server,
+                "message": content,
+                "id": content,
+            },
+        )
+        recorder.record_sent("sctp", content, time.perf_counter())
+        try:
+            # Blocking socket calls stay off the event loop being measured
+            await loop.run_in_executor(
+                None,
+                lambda: sock.sctp_send(
+                    (line + "\n").encode(),
+                    to=(args.host, args.port),
+                ),
+            )
+        except OSError:
+            recorder.errors["sctp_send"] += 1
+            recorder.discard("sctp", content)
+
+    try:
+        await _paced(args.rate, args.duration, send)
+    finally:
+        sock.close()
+
+
+async def poller(
+    session: aiohttp.ClientSession,
+    url: str,
+    recorder: Recorder,
+    cursor: int,
+    stop: asyncio.Event,
+    args: argparse.Namespace,
+) -> None:
+    """Long-poll GET /messages with a cursor until stopped."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            async with session.get(
+                url,
+                params={"after": cursor, "wait": args.poll_wait},
+            ) as response:
+                if response.status != 200:
+                    recorder.errors[f"poll_{response.status}"] += 1
+                    await asyncio.sleep(args.poll_wait)
+                    continue
+                messages = await response.json()
+                cursor = int(response.headers.get("X-Message-Cursor", cursor))
+        except aiohttp.ClientError:
+            recorder.errors["poll_client"] += 1
+            await asyncio.sleep(args.poll_wait)
+            continue
+
+        recorder.record_poll(messages, time.perf_counter() - started)
+
+
+def _apply_config(args: argparse.Namespace) -> None:
+    """Point the relay config at the benchmark before it is imported."""
+    config.API_HOST = args.host
+    config.API_PORT = args.port
+    config.JOURNAL_PATH = args.journal
+    config.OUTBOX_PATH = args.outbox
+    config.OUTBOUND_QUEUE_SIZE = args.queue_size
+    config.API_ACCESS_LOG = False
+    config.SCTP_ENABLED = args.sctp_senders > 0
+    config.HTTP_WORKERS = args.http_workers
+    # The stand-ins take the place of the real chat bridges
+    config.DISCORD_TOKEN = ""
+    config.MATRIX_TOKEN = ""
+    if not args.ingress_limits:
+        config.INGRESS_SENDER_RATE = 0
+        config.INGRESS_SOURCE_RATE = 0
+
+
+def _version() -> str | None:
+    """Git revision of the tree being benchmarked."""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    """Run one benchmark and return the results."""
+    _apply_config(args)
+
+    # Imported after the config is set, module defaults read it at import
+    from main_relay import ChatRelay
+    from message_buffer import message_buffer
+    from outbound_queue import OutboundQueue
+
+    logging.getLogger().setLevel(args.log_level)
+
+    recorder = Recorder()
+    relay = ChatRelay()
+    destinations = ["discord", "matrix"]
+    fakes = {
+        name: FakeBridge(
+            name,
+            recorder,
+            latency=args.send_latency,
+            failure_rate=args.failure_rate,
+            rate=args.send_rate,
+            burst=args.send_burst,
+        )
+        for name in destinations
+    }
+    for name, bridge in fakes.items():
+        relay.bridges[name] = bridge
+        relay.outbound_queues[name] = OutboundQueue(
+            name.capitalize(),
+            bridge.post_message,
+            bridge.post_messages,
+            bridge.coalesce_delay,
+        )
+
+    running = asyncio.create_task(relay.start())
+    await relay.ready.wait()
+
+    base = f"http://{args.host}:{args.port}"
+    stop_polling = asyncio.Event()
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        pollers = [
+            asyncio.create_task(
+                poller(
+                    session,
+                    f"{base}/messages",
+                    recorder,
+                    message_buffer.last_seq,
+                    stop_polling,
+                    args,
+                ),
+            )
+            for _ in range(args.pollers)
+        ]
+        senders = [
+            http_sender(session, f"{base}/messages", recorder, i, args)
+            for i in range(args.http_senders)
+        ]
+        senders += [sctp_sender(recorder, i, args) for i in range(args.sctp_senders)]
+
+        started = time.perf_counter()
+        await asyncio.gather(*senders)
+        sending = time.perf_counter() - started
+
+        # Give the outbound queues time to catch up
+        deadline = time.perf_counter() + args.drain
+        while recorder.undelivered(destinations) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+
+        stop_polling.set()
+        for task in pollers:
+            task.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
+
+    await relay.stop()
+    await running
+
+    sent = len(recorder.sent)
+    return {
+        "version": _version(),
+        "params": vars(args),
+        "send_seconds": round(sending, 3),
+        "elapsed_seconds": round(elapsed, 3),
+        "ingress": {
+            "sent": dict(recorder.sent_by),
+            "rate": round(sent / sending, 1) if sending else None,
+        },
+        "delivery": {
+            name: {
+                "delivered": len(recorder.delivered.get(name, ())),
+                "undelivered": sent - len(recorder.delivered.get(name, ())),
+                "sends": fakes[name].sends,
+                "throughput": round(
+                    len(recorder.delivered.get(name, ())) / elapsed,
+                    1,
+                ),
+                "latency_ms": percentiles(recorder.delivery_latency.get(name, [])),
+            }
+            for name in destinations
+        },
+        "polling": {
+            "requests": recorder.polled,
+            "request_ms": percentiles(recorder.poll_seconds),
+            "latency_ms": percentiles(recorder.poll_latency),
+        },
+        "errors": dict(recorder.errors),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--drain", type=float, default=10.0)
+    parser.add_argument("--http-workers", type=int, default=1)
+    parser.add_argument("--http-senders", type=int, default=10)
+    parser.add_argument("--sctp-senders", type=int, default=0)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=5.0,
+        help="messages per second per sender",
+    )
+    parser.add_argument("--servers", type=int, default=4)
+    parser.add_argument("--pollers", type=int, default=10)
+    parser.add_argument("--poll-wait", type=float, default=5.0)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--send-latency", type=float, default=0.0)
+    parser.add_argument("--send-rate", type=float, default=0.0)
+    parser.add_argument("--send-burst", type=int, default=5)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--queue-size", type=int, default=config.OUTBOUND_QUEUE_SIZE)
+    parser.add_argument("--journal", default="", help="journal directory")
+    parser.add_argument("--outbox", default="", help="outbox SQLite path")
+    parser.add_argument(
+        "--ingress-limits",
+        action="store_true",
+        help="keep the configured ingress rate limits",
+    )
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="write JSON results to this file")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+    args = parse_args()
+    results = asyncio.run(run(args))
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
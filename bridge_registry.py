@@ -0,0 +1,117 @@
+"""Registry of relay bridges.
+Bridges are registered by name and their modules are only imported when
+their configuration is present, so deployments using a subset of platforms
+never load the client libraries of the others.
+"""
+
+import asyncio
+import importlib
+from collections.abc import Callable
+from typing import NamedTuple, Protocol
+
+import config
+from message_buffer import AddMessagesType, AddMessageType
+
+
+class Bridge(Protocol):
+    """Interface shared by all bridges.
+
+    Ingress bridges also have a ready event set once they accept messages,
+    and bridges that can be routed to have post_message, post_messages and
+    coalesce_delay for their outbound queue.
+    """
+
+    async def start(self) -> None: ...
+
+    async def stop(self) -> None: ...
+
+
+class BridgeSpec(NamedTuple):
+    """How to load a bridge and when it is enabled."""
+
+    module: str
+    class_name: str
+    enabled: Callable[[], bool]
+    # Outbound queue label for bridges messages can be routed to
+    label: str | None = None
+    # Receives game server messages, the relay is ready once these listen
+    ingress: bool = False
+
+
+def _discord_configured() -> bool:
+    return config.DISCORD_TOKEN not in ("", "your_discord_bot_token_here")
+
+
+def _matrix_configured() -> bool:
+    return (
+        config.MATRIX_TOKEN not in ("", "your_matrix_token_here")
+        and bool(config.MATRIX_USER_ID)
+        and bool(config.MATRIX_HOMESERVER)
+    )
+
+
+# Bridge name -> spec, in startup order
+BRIDGES: dict[str, BridgeSpec] = {
+    "http": BridgeSpec(
+        "http_bridge",
+        "HTTPBridge",
+        lambda: config.HTTP_ENABLED and config.HTTP_WORKERS <= 1,
+        ingress=True,
+    ),
+    "http_workers": BridgeSpec(
+        "http_workers",
+        "HTTPWorkerPool",
+        lambda: config.HTTP_ENABLED and config.HTTP_WORKERS > 1,
+        ingress=True,
+    ),
+    "sctp": BridgeSpec(
+        "sctp_bridge",
+        "SCTPBridge",
+        lambda: config.SCTP_ENABLED,
+        ingress=True,
+    ),
+    "discord": BridgeSpec(
+        "discord_bridge",
+        "DiscordBridge",
+        _discord_configured,
+        label="Discord",
+    ),
+    "matrix": BridgeSpec(
+        "matrix_bridge",
+        "MatrixBridge",
+        _matrix_configured,
+        label="Matrix",
+    ),
+}
+
+
+def enabled_bridges() -> list[str]:
+    """Names of the bridges whose configuration is present."""
+    return [name for name, spec in BRIDGES.items() if spec.enabled()]
+
+
+def create_bridge(
+    name: str,
+    add_message: AddMessageType,
+    add_messages: AddMessagesType,
+) -> Bridge:
+    """Import a bridge module and construct the bridge.
+
+    Ingress bridges are given the batch callback as well.
+    """
+    spec = BRIDGES[name]
+    bridge_class = getattr(importlib.import_module(spec.module), spec.class_name)
+    if spec.ingress:
+        return bridge_class(add_message, add_messages)
+    return bridge_class(add_message)
+
+
+async def wait_ready(bridges: dict[str, Bridge]) -> None:
+    """Wait until every ingress bridge accepts messages."""
+    await asyncio.gather(
+        *(
+            bridge.ready.wait()
+            for name, bridge in bridges.items()
+            if BRIDGES[name].ingress
+        ),
+    )
@@ -2,6 +2,8 @@
 Edit these values according to your setup.
 """
 
+from typing import Any
+
 # Discord Configuration
 DISCORD_GUILD = 0
 
@@ -12,6 +14,21 @@ DISCORD_INPUT_CHANNELS: list[str] = [
 ]
 DISCORD_OUTPUT_CHANNEL: str = ""
 
+# Discord allows about this many sends per period (seconds) in one channel
+DISCORD_RATE_LIMIT: int = 5
+DISCORD_RATE_PERIOD: float = 5.0
+# Seconds to wait for more relayed lines before sending them as one message
+DISCORD_COALESCE_WINDOW: float = 0.25
+# Distinct relayed lines whose emoji substitution is memoized
+DISCORD_EMOJI_MEMO_SIZE: int = 1024
+# File caching the guild emoji map between runs, empty to disable
+DISCORD_EMOJI_CACHE_PATH: str = ""
+# Seconds an edited message must stay unchanged before the edit is relayed
+DISCORD_EDIT_DEBOUNCE: float = 3.0
+# Recently relayed messages remembered to drop edits that change nothing
+DISCORD_EDIT_CACHE_SIZE: int = 1024
+DISCORD_EDIT_CACHE_TTL: float = 3600.0
+
 MATRIX_INPUT_CHANNELS: list[str] = [
     "",
     "",
@@ -19,6 +36,12 @@ MATRIX_INPUT_CHANNELS: list[str] = [
 ]
 MATRIX_OUTPUT_CHANNEL: str = ""
 
+# Matrix sends per second and burst allowed before pacing kicks in
+MATRIX_RATE_LIMIT: float = 1.0
+MATRIX_RATE_BURST: int = 5
+# Maximum relayed lines merged into one Matrix event when a backlog builds
+MATRIX_COALESCE_MAX_LINES: int = 20
+
 # Matrix homeserver URL
 MATRIX_HOMESERVER = "http://matrix:8008"  # or your homeserver
 
@@ -31,9 +54,107 @@ MATRIX_TOKEN = ""
 # Device ID for this client instance
 MATRIX_DEVICE_ID = ""
 
+# Directory for matrix-nio's client store, empty to disable
+MATRIX_STORE_PATH = ""
+
+# File keeping the sync token between runs, empty to always start fresh
+MATRIX_SYNC_TOKEN_PATH = ""
+
+# Maximum timeline events per room in a single sync response
+MATRIX_SYNC_TIMELINE_LIMIT: int = 10
+
+# Display name cache size and seconds before an entry is looked up again
+MATRIX_DISPLAY_NAME_CACHE_SIZE: int = 1024
+MATRIX_DISPLAY_NAME_TTL: float = 3600.0
+
+# Deduplication: client message IDs remembered to drop retried sends
+DEDUP_WINDOW_SIZE: int = 10000
+DEDUP_WINDOW_SECONDS: float = 300.0
+
+# Ingress rate limits: messages per second and burst, per (platform, sender)
+# and per source platform or game server. A rate of 0 disables the limit.
+INGRESS_SENDER_RATE: float = 1.0
+INGRESS_SENDER_BURST: int = 5
+INGRESS_SOURCE_RATE: float = 20.0
+INGRESS_SOURCE_BURST: int = 50
+# What to do with limited messages: "drop", "delay" or "collapse" into "xN"
+INGRESS_POLICY: str = "collapse"
+# Longest wait in seconds for the "delay" policy before a message is dropped
+INGRESS_MAX_DELAY: float = 2.0
+# Most distinct lines queued per sender by the "collapse" policy
+INGRESS_MAX_PENDING: int = 20
+# Tracked senders and seconds before an idle sender's bucket is forgotten
+INGRESS_MAX_KEYS: int = 10000
+INGRESS_IDLE_SECONDS: float = 600.0
+# Distinct platforms labelled in ingress metrics, later ones count as "other"
+INGRESS_MAX_PLATFORM_LABELS: int = 100
+
+# Routing Configuration
+# Each route sends messages from a source to destination bridges, e.g.
+#   {"platform": "discord", "channel": "123", "to": ["matrix"]}
+#   {"platform": "*", "to": ["discord", "matrix"], "match": "^[^/]"}
+# platform is "discord", "matrix" or a game server name ("*" for any other
+# source), channel is optional and match is an optional content regex.
+# Chat channels are only read when a route names them explicitly, and other
+# messages claiming a chat platform are dropped unless a route without a
+# channel covers that platform. Leave empty to route the input channels
+# above into the buffer and game servers to both bridges.
+ROUTES: list[dict[str, Any]] = []
+
 # API Configuration
 API_HOST: str = "10.0.0.1"
 API_PORT: int = 8000
+# Ingress bridges to run: HTTP on API_PORT over TCP, SCTP on the same port
+HTTP_ENABLED: bool = True
+SCTP_ENABLED: bool = True
+# Log every HTTP request through uvicorn's access logger
+API_ACCESS_LOG: bool = True
+# Processes serving the HTTP API; above 1 they share the listening socket and
+# read the buffer through a local broker, 1 serves it from the relay process
+HTTP_WORKERS: int = 1
+# Unix socket of the message broker used by HTTP workers
+BROKER_SOCKET_PATH: str = "/tmp/chat_relay_broker.sock"
 
 # Buffer Configuration
 BUFFER_SIZE: int = 10
+# Per-channel (platform or game server) history kept for filtered queries
+CHANNEL_BUFFER_SIZE: int = BUFFER_SIZE
+# Most channels with their own history; the least recently active is dropped
+MAX_CHANNELS: int = 256
+
+# Journal Configuration
+# Directory for the on-disk message journal, empty to keep history in memory only
+JOURNAL_PATH: str = ""
+# Messages retained by compaction and replayed at startup
+JOURNAL_KEEP: int = BUFFER_SIZE
+# Segment file size in bytes before rolling over to a new one
+JOURNAL_SEGMENT_BYTES: int = 4 * 1024 * 1024
+# Maximum seconds between fsyncs of journal writes
+JOURNAL_FSYNC_INTERVAL: float = 1.0
+
+# Outbound Configuration
+# Maximum pending messages per destination bridge before the oldest is dropped
+OUTBOUND_QUEUE_SIZE: int = 1000
+# Maximum messages handed to a bridge that coalesces sends
+OUTBOUND_BATCH_SIZE: int = 50
+# SQLite file keeping undelivered messages across restarts, empty for memory only
+OUTBOX_PATH: str = ""
+# Retry backoff in seconds for failed deliveries (doubles up to the maximum)
+OUTBOX_RETRY_BASE: float = 1.0
+OUTBOX_RETRY_MAX: float = 60.0
+# Failed attempts before a message is moved to the dead_letter table so later
+# messages can go out, 0 to retry forever
+OUTBOX_MAX_ATTEMPTS: int = 10
+
+# Long polling: upper bound in seconds for GET /messages?wait=
+LONG_POLL_MAX_WAIT: float = 30.0
+
+# Streaming: seconds between keepalive frames on GET /messages/stream
+STREAM_KEEPALIVE: float = 15.0
+
+# Logging Configuration
+LOG_LEVEL: str = "INFO"
+# Format and write log records on a background thread instead of the event loop
+LOG_ASYNC: bool = True
+# Log one in N per-message lines (received and relayed messages), 0 for none
+LOG_MESSAGE_SAMPLE_EVERY: int = 100
@@ -2,15 +2,24 @@
 Handles message receiving from input channels and sending to output channel.
 """
 
+import asyncio
 import logging
+from collections.abc import Sequence
 
 import discord
 
 import config
-from message_buffer import AddMessageType
+from discord_emoji import EmojiMap
+from message_buffer import AddMessageType, Message
+from rate_limit import TokenBucket
+from routing import routing_table
+from ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Discord rejects messages longer than this
+MAX_MESSAGE_LENGTH = 2000
+
 
 class DiscordBridge:
     """Discord bridge for relaying messages."""
@@ -28,7 +37,23 @@ class DiscordBridge:
         self.add_message = add_message
         self.bot: discord.Bot | None = None
         self._output_channel: discord.TextChannel | None = None
-        self.emojis = {}
+        self.emojis = EmojiMap()
+        self._emoji_refresh: asyncio.Task | None = None
+        # Message ID -> debounce task for the latest pending edit
+        self._pending_edits: dict[int, asyncio.Task] = {}
+        # Message ID -> content last relayed, to drop edits that change nothing
+        self._relayed: TTLCache[int, str] = TTLCache(
+            config.DISCORD_EDIT_CACHE_SIZE,
+            config.DISCORD_EDIT_CACHE_TTL,
+        )
+        # Render emojis from the first message instead of after the first fetch
+        if config.DISCORD_EMOJI_CACHE_PATH:
+            self.emojis.load(config.DISCORD_EMOJI_CACHE_PATH)
+        # Mirrors Discord's per-channel send limit so we batch before hitting it
+        self._send_bucket = TokenBucket(
+            config.DISCORD_RATE_LIMIT / config.DISCORD_RATE_PERIOD,
+            config.DISCORD_RATE_LIMIT,
+        )
 
     async def start(self) -> None:
         """Start the Discord bot."""
@@ -55,8 +80,18 @@ class DiscordBridge:
         async def on_ready() -> None:
             logger.info(f"Discord bot logged in as {self.bot.user}")
             await self._setup_output_channel()
-            if self.bot is not None:
-                self.emojis = await self.get_emojis(self.bot)
+            # Fetch once in the background; reconnects rely on update events
+            if self._emoji_refresh is None:
+                self._emoji_refresh = asyncio.create_task(self._refresh_emojis())
+
+        @self.bot.event
+        async def on_guild_emojis_update(
+            guild: discord.Guild,
+            before: Sequence[discord.Emoji],
+            after: Sequence[discord.Emoji],
+        ) -> None:
+            if guild.id == config.DISCORD_GUILD:
+                self._set_emojis(self.emoji_mapping(after))
 
         @self.bot.event
         async def on_message(message: discord.Message) -> None:
@@ -66,8 +101,17 @@ class DiscordBridge:
         async def on_message_edit(
             before: discord.Message, after: discord.Message
         ) -> None:
-            # Resend edits as new messages
-            await self._handle_message(after, is_edit=True)
+            # Embed unfurls also fire edits without touching the text
+            if before.clean_content == after.clean_content:
+                return
+
+            # Resend edits as new messages once the user stops editing
+            pending = self._pending_edits.pop(after.id, None)
+            if pending is not None:
+                pending.cancel()
+            self._pending_edits[after.id] = asyncio.create_task(
+                self._debounced_edit(after),
+            )
 
         try:
             await self.bot.start(config.DISCORD_TOKEN)
@@ -98,8 +142,9 @@ class DiscordBridge:
         if message.author == self.bot.user:
             return
 
-        # Only process messages from configured input channels
-        if str(message.channel.id) not in config.DISCORD_INPUT_CHANNELS:
+        # Only process messages from routed input channels
+        channel = str(message.channel.id)
+        if not routing_table.is_input("discord", channel):
             return
 
         # Ignore attachments and embeds for now
@@ -107,24 +152,63 @@ class DiscordBridge:
             return
 
         content = message.clean_content
+        if self._relayed.get(message.id) == content:
+            return
+        self._relayed.set(message.id, content)
 
         # Add to buffer via rewrite content
         processed_content = self.rewrite_content(content)
+        if is_edit:
+            processed_content += " (edited)"
         await self.add_message(
             message.author.display_name,
             "discord",
             processed_content,
+            channel,
         )
 
+    async def _debounced_edit(self, message: discord.Message) -> None:
+        """Relay an edit after DISCORD_EDIT_DEBOUNCE seconds without further edits."""
+        await asyncio.sleep(config.DISCORD_EDIT_DEBOUNCE)
+        self._pending_edits.pop(message.id, None)
+        await self._handle_message(message, is_edit=True)
+
     def rewrite_content(self, message: str) -> str:
         """Rewrite message for formatting.
 
-        To be modified for adding caching emojis.
+        Custom emoji markup becomes plain :name: for the game.
         """
-        return message
+        return self.emojis.unrender(message)
+
+    async def _refresh_emojis(self) -> None:
+        """Replace the emoji map with the guild's current emojis."""
+        try:
+            mapping = await self.get_emojis(self.bot)
+        except Exception as e:
+            logger.exception(f"Failed to refresh emojis: {e}")
+            return
+
+        # An empty result usually means the fetch failed, keep the cache
+        if mapping:
+            self._set_emojis(mapping)
+
+    def _set_emojis(self, mapping: dict[str, str]) -> None:
+        """Update the emoji map and its cache file."""
+        if mapping == self.emojis.mapping:
+            return
+
+        self.emojis.update(mapping)
+        logger.info(f"Emoji map updated with {len(mapping)} emojis")
+        if config.DISCORD_EMOJI_CACHE_PATH:
+            self.emojis.save(config.DISCORD_EMOJI_CACHE_PATH)
 
     @staticmethod
     async def get_emojis(bot: discord.Bot) -> dict[str, str]:
+        # Use the gateway's guild cache when it is populated
+        guild = bot.get_guild(config.DISCORD_GUILD)
+        if guild is not None:
+            return DiscordBridge.emoji_mapping(guild.emojis)
+
         # Fetch guild by ID
         try:
             guild = await bot.fetch_guild(config.DISCORD_GUILD)
@@ -142,7 +226,11 @@ class DiscordBridge:
             logger.warning(f"No custom emojis found in {guild.name}")
             return {}
 
-        # Format emoji list
+        return DiscordBridge.emoji_mapping(emojis)
+
+    @staticmethod
+    def emoji_mapping(emojis: Sequence[discord.Emoji]) -> dict[str, str]:
+        """Format usable emojis as :name: to markup."""
         mapping: dict[str, str] = {}
         for emoji in emojis:
             if emoji.is_usable():
@@ -150,26 +238,22 @@ class DiscordBridge:
 
         return mapping
 
+    def _format_line(self, sender: str, platform: str, content: str) -> str:
+        """Format a relayed message as one Discord line."""
+        # Rewrite content with emojis
+        content = self.emojis.render(content)
+        return f"**[{platform}]** {sender}: {content}"
+
     async def post_message(self, sender: str, platform: str, content: str) -> bool:
         """Post a message to Discord output channel."""
         if not self._output_channel:
             logger.warning("Discord output channel not configured")
             return False
 
-        # Rewrite content with emojis
-        words = content.split(" ")
-        rep = False
-        for i, word in enumerate(words):
-            if word in self.emojis:
-                words[i] = self.emojis[word]
-                rep = True
-
-        if rep:
-            content = " ".join(words)
-
         try:
-            formatted_message = f"**[{platform}]** {sender}: {content}"
-            await self._output_channel.send(formatted_message)
+            formatted_message = self._format_line(sender, platform, content)
+            await self._send_bucket.acquire()
+            await self._output_channel.send(formatted_message[:MAX_MESSAGE_LENGTH])
             return True
         except discord.HTTPException as e:
             logger.exception(f"Failed to send Discord message: {e}")
@@ -178,7 +262,84 @@ class DiscordBridge:
             logger.exception(f"Unexpected error sending Discord message: {e}")
             return False
 
+    async def post_messages(self, messages: list[Message]) -> int:
+        """Post messages to Discord output channel, merged into as few sends as possible.
+
+        Returns:
+            Number of leading messages that were delivered
+
+        """
+        if not self._output_channel:
+            logger.warning("Discord output channel not configured")
+            return 0
+
+        delivered = 0
+        for text, completed in self._coalesce(messages):
+            try:
+                await self._send_bucket.acquire()
+                await self._output_channel.send(text)
+            except discord.HTTPException as e:
+                logger.exception(f"Failed to send Discord message: {e}")
+                return delivered
+            except Exception as e:
+                logger.exception(f"Unexpected error sending Discord message: {e}")
+                return delivered
+            delivered += completed
+
+        return delivered
+
+    def coalesce_delay(self, pending: int) -> float:
+        """Seconds to wait for more lines before sending the pending ones.
+
+        Near the rate limit this waits until a send is available again, so
+        lines pile up into fewer messages instead of queueing inside pycord.
+        """
+        wait = self._send_bucket.time_until()
+        if pending >= config.OUTBOUND_BATCH_SIZE:
+            return wait
+        return max(config.DISCORD_COALESCE_WINDOW, wait)
+
+    def _coalesce(self, messages: list[Message]) -> list[tuple[str, int]]:
+        """Merge messages into Discord-sized chunks.
+
+        Returns:
+            (text, completed) pairs, where completed counts the messages
+            whose last line is in that chunk
+
+        """
+        chunks: list[tuple[str, int]] = []
+        lines: list[str] = []
+        size = 0
+        completed = 0
+
+        for message in messages:
+            line = self._format_line(
+                message["sender"],
+                message["platform"],
+                message["content"],
+            )
+            # Split lines that are too long on their own
+            for start in range(0, max(len(line), 1), MAX_MESSAGE_LENGTH):
+                piece = line[start : start + MAX_MESSAGE_LENGTH]
+                if lines and size + 1 + len(piece) > MAX_MESSAGE_LENGTH:
+                    chunks.append(("\n".join(lines), completed))
+                    lines = []
+                    completed = 0
+                size = size + 1 + len(piece) if lines else len(piece)
+                lines.append(piece)
+            completed += 1
+
+        if lines:
+            chunks.append(("\n".join(lines), completed))
+
+        return chunks
+
     async def stop(self) -> None:
         """Stop the Discord bot."""
+        if self._emoji_refresh and not self._emoji_refresh.done():
+            self._emoji_refresh.cancel()
+        for pending in self._pending_edits.values():
+            pending.cancel()
+        self._pending_edits.clear()
         if self.bot:
             await self.bot.close()
@@ -0,0 +1,95 @@
+"""Discord custom emoji substitution.
+Renders :name: tokens as guild emoji markup and turns markup back into
+:name: tokens for game servers.
+"""
+
+import functools
+import json
+import logging
+import os
+import re
+from pathlib import Path
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Custom emoji markup as sent by Discord, static <:name:id> or animated <a:name:id>
+EMOJI_MARKUP = re.compile(r"<a?(:\w+:)\d+>")
+
+
+class EmojiMap:
+    """Mapping of :name: tokens to Discord emoji markup with a compiled matcher."""
+
+    def __init__(self, mapping: dict[str, str] | None = None) -> None:
+        """Initialize the emoji map.
+
+        Args:
+            mapping: :name: tokens mapped to emoji markup
+
+        """
+        self._mapping: dict[str, str] = {}
+        self._pattern: re.Pattern[str] | None = None
+        self._render = functools.lru_cache(maxsize=config.DISCORD_EMOJI_MEMO_SIZE)(
+            self._substitute,
+        )
+        self.update(mapping or {})
+
+    def __len__(self) -> int:
+        return len(self._mapping)
+
+    @property
+    def mapping(self) -> dict[str, str]:
+        """Copy of the current :name: to markup mapping."""
+        return dict(self._mapping)
+
+    def update(self, mapping: dict[str, str]) -> None:
+        """Replace the mapping, recompiling the matcher only if it changed."""
+        if mapping == self._mapping:
+            return
+
+        self._mapping = dict(mapping)
+        if mapping:
+            # Longest first so overlapping names prefer the full match
+            names = sorted(mapping, key=len, reverse=True)
+            self._pattern = re.compile("|".join(map(re.escape, names)))
+        else:
+            self._pattern = None
+        self._render.cache_clear()
+
+    def load(self, path: str) -> None:
+        """Load the mapping from a cache file written by save."""
+        try:
+            self.update(json.loads(Path(path).read_text()))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to load emoji cache {path}: {e}")
+            return
+
+        logger.info(f"Loaded {len(self)} emojis from cache")
+
+    def save(self, path: str) -> None:
+        """Write the mapping to a cache file."""
+        target = Path(path)
+        tmp = target.with_name(target.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps(self._mapping))
+            os.replace(tmp, target)
+        except OSError as e:
+            logger.warning(f"Failed to save emoji cache {path}: {e}")
+
+    def render(self, content: str) -> str:
+        """Replace every known :name: token with its emoji markup in one pass."""
+        if self._pattern is None:
+            return content
+        return self._render(content)
+
+    @staticmethod
+    def unrender(content: str) -> str:
+        """Rewrite Discord emoji markup back to plain :name: tokens."""
+        return EMOJI_MARKUP.sub(r"\1", content)
+
+    def _substitute(self, content: str) -> str:
+        """Uncached substitution used by render."""
+        return self._pattern.sub(lambda match: self._mapping[match[0]], content)
@@ -3,14 +3,31 @@ Provides HTTP endpoints for posting and retrieving messages.
 Messages are only received by Mindustry.
 """
 
+import asyncio
+import json
 import logging
-from collections.abc import Callable
+import math
+import socket
+import zlib
+from collections.abc import AsyncIterator, Awaitable, Callable
 
-from fastapi import FastAPI, HTTPException
+import uvicorn
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 import config
-from message_buffer import AddMessageType, Message, message_buffer
+import metrics
+from message_broker import RemoteMessageBuffer
+from message_buffer import (
+    AddMessagesType,
+    AddMessageType,
+    IncomingEntry,
+    Message,
+    MessageBuffer,
+    message_buffer,
+)
+from relay_logging import message_logger
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +38,8 @@ class IncomingMessage(BaseModel):
     user: str
     message: str
     server: str
+    # Optional client message ID, lets retried posts be dropped as duplicates
+    id: str | None = None
 
 
 class HTTPBridge:
@@ -29,17 +48,32 @@ class HTTPBridge:
     def __init__(
         self,
         add_message: AddMessageType,
+        add_messages: AddMessagesType | None = None,
         preprocess_function: Callable[[dict[str, str]], dict[str, str]] | None = None,
+        buffer: MessageBuffer | RemoteMessageBuffer = message_buffer,
+        render_metrics: Callable[[], Awaitable[str]] | None = None,
     ) -> None:
         """Initialize the HTTP bridge.
 
         Args:
+            add_message: Callback when a new message is received
+            add_messages: Callback for a batch of messages, defaults to
+                calling add_message for each
             preprocess_function: Function to preprocess incoming messages
+            buffer: Buffer messages are read from, remote in HTTP workers
+            render_metrics: Coroutine rendering the metrics to expose,
+                defaults to this process's metrics
 
         """
         self.app = FastAPI(title="Chat Relay API")
         self.add_message = add_message
+        self.add_messages = add_messages or self._add_each
         self.preprocess_function = preprocess_function or (lambda x: x)
+        self.buffer = buffer
+        self.render_metrics = render_metrics
+        # Set once the server is listening
+        self.ready = asyncio.Event()
+        self._server: uvicorn.Server | None = None
         self._setup_routes()
 
     def _setup_routes(self) -> None:
@@ -49,44 +83,229 @@ class HTTPBridge:
         async def post_message(message: IncomingMessage) -> dict[str, str]:
             """Endpoint to receive incoming messages via JSON POST."""
             try:
-                # Preprocess the message
-                preprocessed = self.preprocess_function(
-                    {"user": message.user, "message": message.message},
-                )
-
-                # Extract user and message from preprocessed data
-                user = preprocessed.get("user", message.user)
-                content = preprocessed.get("message", message.message)
-                server = message.server
+                user, server, content, msg_id = self._preprocess(message)
 
                 # Add to buffer
-                await self.add_message(user, server, content)
+                await self.add_message(user, server, content, msg_id=msg_id)
 
-                logger.info(f"Received HTTP message from {user}: {content}")
+                message_logger.info("Received HTTP message from %s: %s", user, content)
                 return {"status": "success", "message": "Message received"}
 
             except Exception as e:
                 logger.exception(f"Error processing HTTP message: {e}")
                 raise HTTPException(status_code=500, detail="Internal server error")
 
-        @self.app.get("/messages")
-        async def get_messages(timestamp: float = 0.0) -> list[Message]:
-            """Endpoint to fetch messages since a given timestamp."""
+        @self.app.post("/messages/batch")
+        async def post_messages(messages: list[IncomingMessage]) -> dict[str, str]:
+            """Endpoint to receive a batch of messages in one JSON POST."""
+            try:
+                entries = [self._preprocess(message) for message in messages]
+                await self.add_messages(entries)
+
+                logger.debug("Received HTTP batch of %d messages", len(entries))
+                return {
+                    "status": "success",
+                    "message": f"{len(entries)} messages received",
+                }
+
+            except Exception as e:
+                logger.exception(f"Error processing HTTP batch: {e}")
+                raise HTTPException(status_code=500, detail="Internal server error")
+
+        @self.app.get("/messages", response_model=list[Message])
+        async def get_messages(
+            timestamp: float = 0.0,
+            after: int | None = None,
+            wait: float = 0.0,
+            exclude: str | None = None,
+            if_none_match: str | None = Header(default=None),
+        ) -> Response:
+            """Endpoint to fetch messages after a cursor or since a timestamp.
+
+            Clients should pass the seq of the last message they saw as
+            after; timestamp is kept for older clients. The cursor to use
+            for the next request is returned in the X-Message-Cursor header.
+
+            With wait > 0 the request is held open until a newer message
+            arrives or the wait (capped at LONG_POLL_MAX_WAIT) elapses.
+
+            Game servers pass their own server name as exclude to skip
+            messages they posted themselves.
+
+            Responses carry an ETag. Polls sending it back in If-None-Match
+            get 304 Not Modified as long as no message was added.
+            """
             # Common bug is user giving millisecond timestamps
             if timestamp > 1000000000000:
                 logger.warning("Client passed millisecond timestamp!")
                 timestamp /= 1000
 
+            # nan would slip through the clamp and poison the deadline
+            if not math.isfinite(wait):
+                wait = 0.0
+            wait = min(max(wait, 0.0), config.LONG_POLL_MAX_WAIT)
+
+            # Unchanged polls are answered from the buffer version alone
+            if wait == 0 and if_none_match:
+                etag = self._etag(self.buffer.version, timestamp, after, exclude)
+                if self._etag_matches(if_none_match, etag):
+                    metrics.POLLS.inc()
+                    metrics.POLLS_NOT_MODIFIED.inc()
+                    return Response(status_code=304, headers={"ETag": etag})
+
             try:
-                return message_buffer.get_messages_since(timestamp)
+                if after is not None:
+                    page = await self.buffer.wait_for_page_after(
+                        after,
+                        wait,
+                        exclude=exclude,
+                    )
+                else:
+                    page = await self.buffer.wait_for_page_since(
+                        timestamp,
+                        wait,
+                        exclude=exclude,
+                    )
             except Exception as e:
                 logger.exception(f"Error retrieving messages: {e}")
                 raise HTTPException(status_code=500, detail="Internal server error")
 
-    async def start(self) -> None:
-        """Start the FastAPI server."""
+            metrics.POLLS.inc()
+            etag = self._etag(page.version, timestamp, after, exclude)
+            if self._etag_matches(if_none_match, etag):
+                metrics.POLLS_NOT_MODIFIED.inc()
+                return Response(status_code=304, headers={"ETag": etag})
+
+            metrics.POLL_RESULT_MESSAGES.observe(page.count)
+            # Messages were serialized when buffered, skip response validation
+            return Response(
+                page.body,
+                media_type="application/json",
+                headers={"ETag": etag, "X-Message-Cursor": str(page.cursor)},
+            )
+
+        @self.app.get("/messages/stream")
+        async def stream_messages(
+            after: int = 0,
+            exclude: str | None = None,
+            last_event_id: str | None = Header(default=None),
+        ) -> StreamingResponse:
+            """Server-Sent Events stream of messages after a given cursor.
+
+            Buffered messages are replayed first, then each new message is
+            pushed as it is added. Reconnecting clients resume from the
+            Last-Event-ID header.
+            """
+            if last_event_id:
+                try:
+                    after = int(last_event_id)
+                except ValueError:
+                    logger.warning(f"Ignoring invalid Last-Event-ID: {last_event_id}")
+
+            return StreamingResponse(
+                self._event_stream(after, exclude),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache"},
+            )
+
+        @self.app.get("/metrics")
+        async def get_metrics() -> PlainTextResponse:
+            """Endpoint exposing relay metrics in the Prometheus text format."""
+            if self.render_metrics is not None:
+                text = await self.render_metrics()
+            else:
+                text = metrics.render()
+            return PlainTextResponse(
+                text,
+                media_type="text/plain; version=0.0.4",
+            )
+
+    @staticmethod
+    def _etag(
+        version: str,
+        timestamp: float,
+        after: int | None,
+        exclude: str | None,
+    ) -> str:
+        """Entity tag of a GET /messages result at a buffer version."""
+        query = zlib.crc32(f"{timestamp}|{after}|{exclude}".encode())
+        return f'"{version}-{query:08x}"'
+
+    @staticmethod
+    def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+        """Whether an If-None-Match header lists the entity tag."""
+        if not if_none_match:
+            return False
+        return etag in (tag.strip() for tag in if_none_match.split(","))
+
+    def _preprocess(self, message: IncomingMessage) -> IncomingEntry:
+        """Preprocess an incoming message into (user, server, content, ID)."""
+        preprocessed = self.preprocess_function(
+            {"user": message.user, "message": message.message},
+        )
+
+        # Extract user and message from preprocessed data
+        user = preprocessed.get("user", message.user)
+        content = preprocessed.get("message", message.message)
+        return user, message.server, content, message.id
+
+    async def _add_each(self, entries: list[IncomingEntry]) -> None:
+        """Fallback batch callback adding messages one at a time."""
+        for user, server, content, msg_id in entries:
+            await self.add_message(user, server, content, msg_id=msg_id)
+
+    async def _event_stream(
+        self,
+        after: int,
+        exclude: str | None = None,
+    ) -> AsyncIterator[str]:
+        """Yield SSE frames for messages after the cursor, forever."""
+        while True:
+            messages = await self.buffer.wait_for_messages_after(
+                after,
+                config.STREAM_KEEPALIVE,
+                exclude=exclude,
+            )
+            if not messages:
+                # Comment frame keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+
+            for msg in messages:
+                yield f"id: {msg['seq']}\ndata: {json.dumps(msg)}\n\n"
+            after = messages[-1]["seq"]
+
+    async def start(self, sockets: list[socket.socket] | None = None) -> None:
+        """Run the FastAPI server until it is stopped.
+
+        Args:
+            sockets: Listening sockets to serve instead of binding API_HOST
+                and API_PORT, as HTTP workers do
+
+        """
         logger.info(f"Starting HTTP server on {config.API_HOST}:{config.API_PORT}")
+        self._server = uvicorn.Server(
+            uvicorn.Config(
+                self.app,
+                host=config.API_HOST,
+                port=config.API_PORT,
+                log_level="info",
+                access_log=config.API_ACCESS_LOG,
+            ),
+        )
+        serving = asyncio.create_task(self._server.serve(sockets=sockets))
+        try:
+            # uvicorn has no startup callback, poll until it is listening
+            while not self._server.started and not serving.done():
+                await asyncio.sleep(0.05)
+            if self._server.started:
+                self.ready.set()
+            await serving
+        finally:
+            serving.cancel()
 
     async def stop(self) -> None:
         """Stop the HTTP server."""
+        if self._server is not None:
+            self._server.should_exit = True
         logger.info("HTTP server stopped")
@@ -0,0 +1,200 @@
+"""Multi-process HTTP bridge.
+Runs HTTPBridge in HTTP_WORKERS processes accepting from one shared
+listening socket. Workers read and add messages through the message broker
+of the relay process, so the buffer and chat bridges stay singletons.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import socket
+from multiprocessing.process import BaseProcess
+from multiprocessing.synchronize import Event
+from typing import TYPE_CHECKING, Any
+
+import config
+import relay_logging
+from message_broker import MessageBroker, RemoteMessageBuffer
+from message_buffer import AddMessagesType, AddMessageType, message_buffer
+
+if TYPE_CHECKING:
+    from http_bridge import HTTPBridge
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for worker processes that exited
+WORKER_CHECK_INTERVAL = 1.0
+# Seconds between checks for workers listening while starting up
+WORKER_READY_INTERVAL = 0.05
+# Seconds between pushes of a worker's metrics to the relay process
+METRICS_PUSH_INTERVAL = 1.0
+
+
+def config_snapshot() -> dict[str, Any]:
+    """Current settings, including overrides made after config was imported."""
+    return {name: value for name, value in vars(config).items() if name.isupper()}
+
+
+def run_worker(
+    sock: socket.socket,
+    broker_path: str,
+    settings: dict[str, Any],
+    listening: Event,
+) -> None:
+    """Worker process entry point serving the HTTP API on the shared socket.
+
+    Args:
+        sock: Listening socket shared by all workers
+        broker_path: Unix socket path of the relay's message broker
+        settings: Config of the relay process, since spawned workers
+            import a fresh config module
+        listening: Set once this worker serves requests
+
+    """
+    for name, value in settings.items():
+        setattr(config, name, value)
+
+    # Only workers serve HTTP, the relay process never loads FastAPI
+    from http_bridge import HTTPBridge
+
+    relay_logging.configure()
+    buffer = RemoteMessageBuffer(broker_path)
+    bridge = HTTPBridge(
+        buffer.add_message,
+        buffer.add_messages,
+        buffer=buffer,
+        render_metrics=buffer.render_metrics,
+    )
+    try:
+        asyncio.run(_serve(bridge, buffer, sock, listening))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _serve(
+    bridge: "HTTPBridge",
+    buffer: RemoteMessageBuffer,
+    sock: socket.socket,
+    listening: Event,
+) -> None:
+    """Run the HTTP bridge, signalling the pool once it is listening."""
+    serving = asyncio.create_task(bridge.start(sockets=[sock]))
+    started = asyncio.create_task(bridge.ready.wait())
+    pushing = asyncio.create_task(_push_metrics(buffer))
+    try:
+        await asyncio.wait({serving, started}, return_when=asyncio.FIRST_COMPLETED)
+        if bridge.ready.is_set():
+            listening.set()
+        await serving
+    finally:
+        started.cancel()
+        pushing.cancel()
+
+
+async def _push_metrics(buffer: RemoteMessageBuffer) -> None:
+    """Periodically hand the poll metrics counted here to the relay."""
+    while True:
+        await asyncio.sleep(METRICS_PUSH_INTERVAL)
+        try:
+            await buffer.push_metrics()
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"Failed to push worker metrics: {e}")
+
+
+class HTTPWorkerPool:
+    """Ingress bridge running the HTTP API in worker processes.
+
+    The listening socket is bound here and inherited by every worker, and
+    workers that exit are restarted.
+    """
+
+    def __init__(
+        self,
+        add_message: AddMessageType,
+        add_messages: AddMessagesType,
+    ) -> None:
+        """Initialize the worker pool.
+
+        Args:
+            add_message: Callback when a worker receives a message
+            add_messages: Callback when a worker receives a batch
+
+        """
+        self.broker = MessageBroker(
+            config.BROKER_SOCKET_PATH,
+            message_buffer,
+            add_message,
+            add_messages,
+        )
+        # Set once every worker is listening
+        self.ready = asyncio.Event()
+        self._sock: socket.socket | None = None
+        self._processes: list[BaseProcess] = []
+        # Listening event of the worker at the same index
+        self._listening: list[Event] = []
+        self._context = multiprocessing.get_context("spawn")
+        self._stopping = False
+
+    async def start(self) -> None:
+        """Start the broker and workers, restarting workers that exit."""
+        await self.broker.start()
+        self._sock = socket.create_server(
+            (config.API_HOST, config.API_PORT),
+            backlog=2048,
+        )
+        workers = [self._spawn() for _ in range(config.HTTP_WORKERS)]
+        self._processes = [process for process, _ in workers]
+        self._listening = [listening for _, listening in workers]
+
+        while not self._stopping:
+            # Poll quickly until the workers have loaded FastAPI and listen
+            await asyncio.sleep(
+                WORKER_CHECK_INTERVAL if self.ready.is_set() else WORKER_READY_INTERVAL,
+            )
+            for i, process in enumerate(self._processes):
+                if not process.is_alive() and not self._stopping:
+                    logger.warning(
+                        f"HTTP worker {process.pid} exited with code "
+                        f"{process.exitcode}, restarting",
+                    )
+                    self._processes[i], self._listening[i] = self._spawn()
+
+            if not self.ready.is_set() and all(
+                listening.is_set() for listening in self._listening
+            ):
+                logger.info(
+                    f"{config.HTTP_WORKERS} HTTP workers listening on "
+                    f"{config.API_HOST}:{config.API_PORT}",
+                )
+                self.ready.set()
+
+    def _spawn(self) -> tuple[BaseProcess, Event]:
+        """Start a worker process, returning it and its listening event."""
+        listening = self._context.Event()
+        process = self._context.Process(
+            target=run_worker,
+            args=(
+                self._sock,
+                config.BROKER_SOCKET_PATH,
+                config_snapshot(),
+                listening,
+            ),
+            daemon=True,
+        )
+        process.start()
+        return process, listening
+
+    async def stop(self) -> None:
+        """Stop the workers, then the broker."""
+        self._stopping = True
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            await asyncio.to_thread(process.join, 5.0)
+            if process.is_alive():
+                process.kill()
+
+        if self._sock is not None:
+            self._sock.close()
+        await self.broker.stop()
+        logger.info("HTTP workers stopped")
@@ -6,21 +6,22 @@ import asyncio
 import logging
 import signal
 import sys
+import time
 
-import uvicorn
-
+import bridge_registry
 import config
-from discord_bridge import DiscordBridge
-from http_bridge import HTTPBridge
-from matrix_bridge import MatrixBridge
-from message_buffer import Message, message_buffer
-from sctp_bridge import SCTPBridge
+import metrics
+import relay_logging
+from bridge_registry import Bridge
+from message_buffer import IncomingEntry, Message, message_buffer
+from message_journal import MessageJournal
+from outbound_queue import OutboundQueue
+from rate_limit import IngressLimiter
+from routing import routing_table
+from ttl_cache import TTLCache
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+relay_logging.configure()
 logger = logging.getLogger(__name__)
 
 
@@ -35,62 +36,127 @@ class ChatRelay:
 
     def __init__(self) -> None:
         """Initialize the chat relay."""
-        self.discord_bridge = DiscordBridge(self.add_message)
-        self.matrix_bridge = MatrixBridge(self.add_message)
-        self.http_bridge = HTTPBridge(self.add_message)
-        self.sctp_bridge = SCTPBridge(self.add_message)
+        if config.JOURNAL_PATH:
+            message_buffer.attach_journal(MessageJournal(config.JOURNAL_PATH))
+
+        # (platform, client message ID) pairs seen recently, to drop retries
+        self._seen_ids: TTLCache[tuple[str, str], bool] = TTLCache(
+            config.DEDUP_WINDOW_SIZE,
+            config.DEDUP_WINDOW_SECONDS,
+        )
+
+        self.limiter = IngressLimiter(self._accept_message)
+        # Set once every ingress bridge accepts messages
+        self.ready = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._stopped = False
+
+        # Bridge name -> bridge, for the bridges that are configured
+        self.bridges: dict[str, Bridge] = {
+            name: bridge_registry.create_bridge(
+                name,
+                self.add_message,
+                self.add_messages,
+            )
+            for name in bridge_registry.enabled_bridges()
+        }
+        # Destination name in routes -> outbound queue of that bridge
+        self.outbound_queues: dict[str, OutboundQueue] = {}
+        for name, bridge in self.bridges.items():
+            label = bridge_registry.BRIDGES[name].label
+            if label is not None:
+                self.outbound_queues[name] = OutboundQueue(
+                    label,
+                    bridge.post_message,
+                    bridge.post_messages,
+                    bridge.coalesce_delay,
+                )
+
+        self._gauges = [
+            metrics.CallbackMetric(
+                "relay_buffer_messages",
+                "Messages held in the message buffer",
+                lambda: {(): len(message_buffer)},
+            ),
+            metrics.CallbackMetric(
+                "relay_outbox_depth",
+                "Messages waiting for delivery to a destination bridge",
+                lambda: {
+                    (name,): queue.depth
+                    for name, queue in self.outbound_queues.items()
+                },
+                ("destination",),
+            ),
+            metrics.CallbackMetric(
+                "relay_ingress_shed_total",
+                "Messages shed by ingress rate limits",
+                lambda: dict(self.limiter.shed),
+                ("platform", "outcome"),
+                kind="counter",
+            ),
+        ]
 
     async def start(self) -> None:
-        """Start all bridges and the relay system."""
-        # Wait for all tasks
-        # Create tasks for each component
-        tasks = [asyncio.create_task(self.sctp_bridge.listen())]
-        tasks.append(asyncio.create_task(self._start_discord()))
-        tasks.append(asyncio.create_task(self._start_matrix()))
-        tasks.append(asyncio.create_task(self._start_http()))
-
-        logger.info("Starting Chat Relay System")
+        """Start all configured bridges concurrently and run until they stop."""
+        for queue in self.outbound_queues.values():
+            queue.start()
+
+        # Create a task for each bridge, they start concurrently
+        self._tasks = [
+            asyncio.create_task(self._start_bridge(name, bridge))
+            for name, bridge in self.bridges.items()
+        ]
+        ready = asyncio.create_task(self._announce_ready())
+
+        logger.info(f"Starting Chat Relay System: {', '.join(self.bridges)}")
         try:
-            await asyncio.gather(*tasks, return_exceptions=True)
+            # Wait for all tasks
+            await asyncio.gather(*self._tasks, return_exceptions=True)
         except Exception as e:
             logger.exception(f"Error in main tasks: {e}")
         finally:
-            for t in tasks:
-                t.cancel()
+            ready.cancel()
             await self.stop()
 
-    async def _start_discord(self) -> None:
-        """Start Discord bridge with error handling."""
+    async def _start_bridge(self, name: str, bridge: Bridge) -> None:
+        """Start a bridge with error handling."""
         try:
-            await self.discord_bridge.start()
+            await bridge.start()
         except Exception as e:
-            logger.exception(f"Discord bridge failed: {e}")
+            logger.exception(f"{name} bridge failed: {e}")
 
-    async def _start_matrix(self) -> None:
-        """Start Matrix bridge with error handling."""
-        try:
-            await self.matrix_bridge.start()
-        except Exception as e:
-            logger.exception(f"Matrix bridge failed: {e}")
+    async def _announce_ready(self) -> None:
+        """Set ready once ingress is up, without waiting for chat platforms."""
+        await bridge_registry.wait_ready(self.bridges)
+        self.ready.set()
+        logger.info("Chat Relay System ready")
 
-    async def _start_http(self) -> None:
-        """Start API bridge with error handling."""
-        try:
-            # Run uvicorn server
-            config_obj = uvicorn.Config(
-                self.http_bridge.app,
-                host=config.API_HOST,
-                port=config.API_PORT,
-                log_level="info",
-            )
-            server = uvicorn.Server(config_obj)
-            await server.serve()
-        except Exception as e:
-            logger.exception(f"API bridge failed: {e}")
-
-    async def add_message(self, sender: str, platform: str, content: str) -> None:
+    async def add_message(
+        self,
+        sender: str,
+        platform: str,
+        content: str,
+        channel: str | None = None,
+        msg_id: str | None = None,
+    ) -> None:
         """Main message relay loop. Runs when a new message is received."""
-        logger.info("Running message relay loop")
+        metrics.INGRESS_MESSAGES.inc(platform)
+        if self._is_duplicate(platform, msg_id):
+            return
+
+        if self.limiter.admit(sender, platform, content, channel):
+            await self._accept_message(sender, platform, content, channel)
+
+    async def _accept_message(
+        self,
+        sender: str,
+        platform: str,
+        content: str,
+        channel: str | None = None,
+    ) -> None:
+        """Buffer and route a message that passed the ingress checks."""
+        started = time.perf_counter()
+        logger.debug("Running message relay loop")
         # Add to buffer
         msg = message_buffer.add_message(
             sender=sender,
@@ -99,48 +165,96 @@ class ChatRelay:
         )
 
         try:
-            await self._relay_game_message(msg)
+            self._route_message(msg, channel)
         except Exception as e:
             logger.exception(f"Error in message relay loop: {e}")
 
-    async def _relay_game_message(self, message: Message) -> None:
-        """Relay game messages to discord and matrix."""
+        metrics.ADD_MESSAGE_SECONDS.observe(time.perf_counter() - started)
+
+    async def add_messages(self, entries: list[IncomingEntry]) -> None:
+        """Buffer and relay a batch of (sender, platform, content, ID) messages."""
+        logger.debug("Running message relay loop for %d messages", len(entries))
+        for _, platform, _, _ in entries:
+            metrics.INGRESS_MESSAGES.inc(platform)
+
+        admitted = [
+            (sender, platform, rewrite_content(content))
+            for sender, platform, content, msg_id in entries
+            if not self._is_duplicate(platform, msg_id)
+            and self.limiter.admit(sender, platform, content)
+        ]
+        started = time.perf_counter()
+        messages = message_buffer.add_messages(admitted)
+
+        for msg in messages:
+            try:
+                self._route_message(msg)
+            except Exception as e:
+                logger.exception(f"Error in message relay loop: {e}")
+
+        metrics.ADD_MESSAGE_SECONDS.observe(time.perf_counter() - started)
+
+    def _is_duplicate(self, platform: str, msg_id: str | None) -> bool:
+        """Check a client message ID against the dedup window, recording it."""
+        if msg_id is None:
+            return False
+
+        key = (platform, msg_id)
+        if self._seen_ids.get(key):
+            logger.debug("Dropping duplicate message %s from %s", msg_id, platform)
+            return True
+
+        self._seen_ids.set(key, True)
+        return False
+
+    def _route_message(self, message: Message, channel: str | None = None) -> None:
+        """Queue a message for the bridges its route leads to."""
         sender = message["sender"]
         platform = message["platform"]
         content = message["content"]
 
-        if platform in {"discord", "matrix"}:
+        destinations = routing_table.destinations(platform, channel, content)
+        if not destinations:
             return
 
-        logger.info(f"Relaying message from {sender} ({platform}): {content}")
+        relay_logging.message_logger.info(
+            "Relaying message from %s (%s): %s",
+            sender,
+            platform,
+            content,
+        )
 
-        # Relay API messages to Discord
-        for bridge, label in (
-            (self.discord_bridge, "Discord"),
-            (self.matrix_bridge, "Matrix"),
-        ):
-            try:
-                success = await bridge.post_message(
-                    sender,
-                    platform,
-                    content,
-                )
-                if success:
-                    logger.debug("Successfully relayed to %s", label)
-                else:
-                    logger.warning("Failed to relay message to %s", label)
-            except Exception as e:
-                logger.exception(f"Error relaying to %s: {e}", label)
+        # Hand off to each bridge without waiting for delivery
+        for name in destinations:
+            queue = self.outbound_queues.get(name)
+            if queue is None:
+                # Routes may name registered bridges left unconfigured
+                if name not in bridge_registry.BRIDGES:
+                    logger.warning(f"Route to unknown destination: {name}")
+                continue
+            queue.put(message)
 
     async def stop(self) -> None:
         """Stop all bridges and the relay system."""
+        # Shutdown signals and the end of start may both get here
+        if self._stopped:
+            return
+        self._stopped = True
         logger.info("Stopping Chat Relay System")
 
+        self.limiter.stop()
+        for gauge in self._gauges:
+            metrics.unregister(gauge)
+        for queue in self.outbound_queues.values():
+            await queue.stop()
+
         # Stop all bridges
-        for bridge in (self.discord_bridge, self.matrix_bridge, self.http_bridge):
+        for bridge in self.bridges.values():
             await bridge.stop()
+        for task in self._tasks:
+            task.cancel()
 
-        self.sctp_bridge.stop()
+        message_buffer.close()
         logger.info("Chat Relay System stopped")
 
 
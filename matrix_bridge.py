@@ -4,21 +4,29 @@ Modern Matrix integration with support for posting and receiving messages.
 
 import asyncio
 import contextlib
+import html
 import logging
+import os
 import time
+from pathlib import Path
 from typing import Any
 
 from nio import (
     AsyncClient,
     JoinError,
     MatrixRoom,
+    RoomMemberEvent,
     RoomMessageText,
     RoomSendError,
 )
-from nio.responses import SyncResponse
+from nio.responses import SyncResponse, UploadFilterResponse
 
 import config
-from message_buffer import AddMessageType
+from message_buffer import AddMessageType, Message
+from rate_limit import TokenBucket
+from relay_logging import message_logger
+from routing import routing_table
+from ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +47,21 @@ class MatrixBridge:
         self._sync_task: asyncio.Task | None = None
         self._joined_rooms: set[str] = set()
         self._startup_time = time.time()
+        # (room ID, user ID) -> display name in that room, kept fresh by
+        # m.room.member events
+        self._display_names: TTLCache[tuple[str, str], str] = TTLCache(
+            config.MATRIX_DISPLAY_NAME_CACHE_SIZE,
+            config.MATRIX_DISPLAY_NAME_TTL,
+        )
+        # User ID -> global profile display name
+        self._profile_names: TTLCache[str, str] = TTLCache(
+            config.MATRIX_DISPLAY_NAME_CACHE_SIZE,
+            config.MATRIX_DISPLAY_NAME_TTL,
+        )
+        self._send_bucket = TokenBucket(
+            config.MATRIX_RATE_LIMIT,
+            config.MATRIX_RATE_BURST,
+        )
 
     async def start(self) -> None:
         """Start the Matrix bridge."""
@@ -65,6 +88,7 @@ class MatrixBridge:
 
         # Add event callbacks
         self.client.add_event_callback(self._handle_room_message, RoomMessageText)
+        self.client.add_event_callback(self._handle_member_event, RoomMemberEvent)
 
         try:
             # Start syncing
@@ -86,7 +110,7 @@ class MatrixBridge:
 
     async def _join_channels(self) -> None:
         """Join all configured input channels."""
-        channels_to_join = set(config.MATRIX_INPUT_CHANNELS)
+        channels_to_join = set(routing_table.input_channels("matrix"))
 
         # Also join output channel if not already in input channels
         if config.MATRIX_OUTPUT_CHANNEL not in channels_to_join:
@@ -106,26 +130,43 @@ class MatrixBridge:
     async def _sync_loop(self) -> None:
         """Main sync loop for receiving Matrix events."""
         try:
+            sync_filter = await self._upload_sync_filter()
+
+            # Resume from the previous run when possible
+            token = self._load_sync_token()
+            if token:
+                self.client.next_batch = token
+
             # Initial sync to get current state
             logger.info("Performing initial Matrix sync...")
-            sync_response = await self.client.sync(timeout=10000, full_state=True)
+            sync_response = await self.client.sync(
+                timeout=10000,
+                sync_filter=sync_filter,
+                full_state=not token,
+            )
 
             if not isinstance(sync_response, SyncResponse):
                 logger.error(f"Initial sync failed: {sync_response}")
                 return
 
+            self._save_sync_token(sync_response.next_batch)
             logger.info("Initial sync completed, starting continuous sync...")
 
             # Continuous sync loop
             while self._running:
                 try:
-                    sync_response = await self.client.sync(timeout=10000)
+                    sync_response = await self.client.sync(
+                        timeout=10000,
+                        sync_filter=sync_filter,
+                    )
 
                     if not isinstance(sync_response, SyncResponse):
                         logger.warning(f"Sync error: {sync_response}")
                         await asyncio.sleep(5)
                         continue
 
+                    self._save_sync_token(sync_response.next_batch)
+
                 except asyncio.CancelledError:
                     logger.info("Matrix sync loop cancelled")
                     break
@@ -138,6 +179,70 @@ class MatrixBridge:
         finally:
             logger.info("Matrix sync loop ended")
 
+    async def _upload_sync_filter(self) -> str | dict[str, Any]:
+        """Upload a filter limiting sync to relayed rooms and message events.
+
+        Returns:
+            The filter ID, or the filter itself to send inline if the
+            upload failed
+
+        """
+        rooms = list(
+            {*routing_table.input_channels("matrix"), config.MATRIX_OUTPUT_CHANNEL},
+        )
+        room_filter = {
+            "rooms": rooms,
+            "timeline": {
+                # Member events keep the display name cache current
+                "types": ["m.room.message", "m.room.member"],
+                "limit": config.MATRIX_SYNC_TIMELINE_LIMIT,
+            },
+            # Members of message senders are enough to resolve display names
+            "state": {"types": ["m.room.member"], "lazy_load_members": True},
+            "ephemeral": {"types": []},
+            "account_data": {"types": []},
+        }
+        empty = {"types": []}
+
+        response = await self.client.upload_filter(
+            room=room_filter,
+            presence=empty,
+            account_data=empty,
+        )
+        if isinstance(response, UploadFilterResponse):
+            return response.filter_id
+
+        logger.warning(f"Failed to upload Matrix sync filter: {response}")
+        return {"room": room_filter, "presence": empty, "account_data": empty}
+
+    @staticmethod
+    def _load_sync_token() -> str | None:
+        """Read the sync token saved by a previous run."""
+        if not config.MATRIX_SYNC_TOKEN_PATH:
+            return None
+
+        try:
+            return Path(config.MATRIX_SYNC_TOKEN_PATH).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Failed to read Matrix sync token: {e}")
+            return None
+
+    @staticmethod
+    def _save_sync_token(token: str) -> None:
+        """Persist the latest sync token so the next run can resume from it."""
+        if not config.MATRIX_SYNC_TOKEN_PATH or not token:
+            return
+
+        path = Path(config.MATRIX_SYNC_TOKEN_PATH)
+        tmp = path.with_name(path.name + ".tmp")
+        try:
+            tmp.write_text(token)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Failed to save Matrix sync token: {e}")
+
     async def _handle_room_message(
         self, room: MatrixRoom, event: RoomMessageText,
     ) -> None:
@@ -153,28 +258,62 @@ class MatrixBridge:
             ):
                 return
 
-            # Only process messages from input channels
-            if room.room_id not in config.MATRIX_INPUT_CHANNELS:
+            # Only process messages from routed input channels
+            if not routing_table.is_input("matrix", room.room_id):
                 return
 
             # Extract sender display name or use user ID
-            sender_name = room.user_name(event.sender) or event.sender
-
-            # Clean up sender name (remove homeserver part if present)
-            if sender_name.startswith("@") and ":" in sender_name:
-                sender_name = sender_name.split(":")[0][
-                    1:
-                ]  # Remove @ and everything after :
+            key = (room.room_id, event.sender)
+            sender_name = self._display_names.get(key)
+            if sender_name is None:
+                sender_name = self._localpart(
+                    room.user_name(event.sender) or event.sender,
+                )
+                self._display_names.set(key, sender_name)
 
             message_content = event.body.strip()
 
             if message_content:
-                logger.info(f"Matrix message from {sender_name}: {message_content}")
-                await self.add_message(sender_name, "matrix", message_content)
+                message_logger.info(
+                    "Matrix message from %s: %s",
+                    sender_name,
+                    message_content,
+                )
+                await self.add_message(
+                    sender_name,
+                    "matrix",
+                    message_content,
+                    room.room_id,
+                )
 
         except Exception as e:
             logger.exception(f"Error handling Matrix message: {e}")
 
+    async def _handle_member_event(
+        self, room: MatrixRoom, event: RoomMemberEvent,
+    ) -> None:
+        """Refresh cached display names when members join, leave or rename."""
+        key = (room.room_id, event.state_key)
+        # A rename may also be a profile change
+        self._profile_names.pop(event.state_key)
+        if event.membership != "join":
+            self._display_names.pop(key)
+            return
+
+        # Room state already reflects the event, including disambiguation
+        self._display_names.set(
+            key,
+            self._localpart(room.user_name(event.state_key) or event.state_key),
+        )
+
+    @staticmethod
+    def _localpart(user_id: str) -> str:
+        """Clean up a user ID into its username, leaving display names as is."""
+        # Remove @ and everything after :
+        if user_id.startswith("@") and ":" in user_id:
+            return user_id.split(":")[0][1:]
+        return user_id
+
     async def post_message(self, sender: str, platform: str, content: str) -> bool:
         """Post a message to Matrix output channel.
 
@@ -191,30 +330,88 @@ class MatrixBridge:
             logger.warning("Matrix bridge not running")
             return False
 
-        try:
-            # Format the message to show origin
-            formatted_message = f"**[{platform}]** {sender}: {content}"
-
-            # Send to output channel
-            response = await self.client.room_send(
-                room_id=config.MATRIX_OUTPUT_CHANNEL,
-                message_type="m.room.message",
-                content={
-                    "msgtype": "m.text",
-                    "body": formatted_message,
-                },
-            )
+        return await self._send_lines([(sender, platform, content)])
+
+    async def post_messages(self, messages: list[Message]) -> int:
+        """Post messages to Matrix output channel.
+
+        Consecutive messages are sent as one multi-line event, up to
+        MATRIX_COALESCE_MAX_LINES per event.
+
+        Returns:
+            Number of leading messages that were delivered
+
+        """
+        if not self._running or not self.client:
+            logger.warning("Matrix bridge not running")
+            return 0
+
+        delivered = 0
+        step = config.MATRIX_COALESCE_MAX_LINES
+        for start in range(0, len(messages), step):
+            lines = [
+                (msg["sender"], msg["platform"], msg["content"])
+                for msg in messages[start : start + step]
+            ]
+            if not await self._send_lines(lines):
+                break
+            delivered += len(lines)
+
+        return delivered
+
+    def coalesce_delay(self, pending: int) -> float:
+        """Seconds to wait before sending, letting a backlog build while paced."""
+        return self._send_bucket.time_until()
+
+    async def _send_lines(self, lines: list[tuple[str, str, str]]) -> bool:
+        """Send (sender, platform, content) lines as one m.text event.
+
+        Rate limited sends are retried after the delay the homeserver asks
+        for instead of being dropped.
+        """
+        # Format the message to show origin
+        formatted_message = "\n".join(
+            f"**[{platform}]** {sender}: {content}"
+            for sender, platform, content in lines
+        )
+        formatted_html = "<br>".join(
+            f"<strong>[{html.escape(platform)}]</strong> "
+            f"{html.escape(sender)}: {html.escape(content)}"
+            for sender, platform, content in lines
+        )
+
+        while self._running:
+            await self._send_bucket.acquire()
+            try:
+                # Send to output channel
+                response = await self.client.room_send(
+                    room_id=config.MATRIX_OUTPUT_CHANNEL,
+                    message_type="m.room.message",
+                    content={
+                        "msgtype": "m.text",
+                        "body": formatted_message,
+                        "format": "org.matrix.custom.html",
+                        "formatted_body": formatted_html,
+                    },
+                )
+            except Exception as e:
+                logger.exception(f"Error sending Matrix message: {e}")
+                return False
 
             if isinstance(response, RoomSendError):
+                if response.status_code == "M_LIMIT_EXCEEDED":
+                    delay = (response.retry_after_ms or 1000) / 1000
+                    logger.warning(f"Matrix rate limited, retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+
                 logger.error(f"Failed to send Matrix message: {response.message}")
                 return False
 
-            logger.debug(f"Sent Matrix message: {formatted_message}")
+            logger.debug("Sent Matrix message: %s", formatted_message)
             return True
 
-        except Exception as e:
-            logger.exception(f"Error sending Matrix message: {e}")
-            return False
+        return False
 
     async def stop(self) -> None:
         """Stop the Matrix bridge."""
@@ -255,17 +452,20 @@ class MatrixBridge:
 
     async def get_user_display_name(self, user_id: str) -> str:
         """Get the display name for a user ID."""
+        cached = self._profile_names.get(user_id)
+        if cached is not None:
+            return cached
+
         if not self.client:
             return user_id
 
         try:
             response = await self.client.get_displayname(user_id)
             if hasattr(response, "displayname") and response.displayname:
+                self._profile_names.set(user_id, response.displayname)
                 return response.displayname
         except Exception as e:
             logger.debug(f"Failed to get display name for {user_id}: {e}")
 
         # Fallback: extract username from user ID
-        if user_id.startswith("@") and ":" in user_id:
-            return user_id.split(":")[0][1:]
-        return user_id
+        return self._localpart(user_id)
@@ -0,0 +1,425 @@
+"""Local message broker for HTTP worker processes.
+The relay process serves its message buffer and ingress callbacks over a
+Unix socket, and workers use RemoteMessageBuffer in place of the global
+buffer.
+"""
+
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+from typing import Any
+
+import metrics
+from message_buffer import (
+    AddMessagesType,
+    AddMessageType,
+    EncodedPage,
+    IncomingEntry,
+    Message,
+    MessageBuffer,
+)
+
+logger = logging.getLogger(__name__)
+
+# Longest request or response line, far more than a full buffer of messages
+MAX_LINE_SIZE = 16 * 1024 * 1024
+
+
+class MessageBroker:
+    """Serves a message buffer and the relay ingress to worker processes.
+
+    Requests and responses are JSON lines tagged with a request ID. A
+    serialized page is sent as a raw frame after its response line, whose
+    "body" field holds the frame length, so the body is never re-encoded.
+    Each request is handled in its own task, so a worker can hold many
+    long polls open on one connection. Untagged lines push the buffer
+    version whenever a message is added.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        buffer: MessageBuffer,
+        add_message: AddMessageType,
+        add_messages: AddMessagesType,
+    ) -> None:
+        """Initialize the broker.
+
+        Args:
+            path: Unix socket path to listen on
+            buffer: Buffer read by the workers
+            add_message: Callback for messages received by a worker
+            add_messages: Callback for batches received by a worker
+
+        """
+        self.path = path
+        self.buffer = buffer
+        self.add_message = add_message
+        self.add_messages = add_messages
+        self._server: asyncio.Server | None = None
+        self._connections: set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        """Listen on the Unix socket, replacing one left by a previous run."""
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(
+            self._handle_connection,
+            self.path,
+            limit=MAX_LINE_SIZE,
+        )
+        logger.info(f"Message broker listening on {self.path}")
+
+    async def stop(self) -> None:
+        """Stop listening and close worker connections."""
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for writer in self._connections:
+            writer.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        """Answer requests from one worker until it disconnects."""
+        self._connections.add(writer)
+        lock = asyncio.Lock()
+        tasks: set[asyncio.Task] = {
+            asyncio.create_task(self._push_versions(writer, lock)),
+        }
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self._respond(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Message broker connection failed: {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _push_versions(
+        self,
+        writer: asyncio.StreamWriter,
+        lock: asyncio.Lock,
+    ) -> None:
+        """Send the buffer version to a worker each time it changes."""
+        while True:
+            seq = self.buffer.last_seq
+            line = json.dumps({"version": self.buffer.version, "seq": seq})
+            async with lock:
+                writer.write(line.encode() + b"\n")
+                with contextlib.suppress(ConnectionError):
+                    await writer.drain()
+            await self.buffer.wait_for_new_message(seq)
+
+    async def _respond(
+        self,
+        line: bytes,
+        writer: asyncio.StreamWriter,
+        lock: asyncio.Lock,
+    ) -> None:
+        """Handle one request and write its response."""
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            logger.exception("Invalid message broker request.")
+            return
+
+        body = b""
+        try:
+            result = await self._dispatch(request["op"], request.get("args", {}))
+            response = {"id": request["id"], "result": result}
+            if isinstance(result, EncodedPage):
+                body = result.body
+                response["result"] = {**result._asdict(), "body": None}
+                response["body"] = len(body)
+        except Exception as e:
+            logger.exception(f"Error handling message broker request: {e}")
+            response = {"id": request["id"], "error": str(e)}
+
+        async with lock:
+            writer.write(json.dumps(response).encode() + b"\n" + body)
+            with contextlib.suppress(ConnectionError):
+                await writer.drain()
+
+    async def _dispatch(self, op: str, args: dict[str, Any]) -> Any:
+        """Run a broker operation."""
+        if op == "after":
+            messages = await self.buffer.wait_for_messages_after(
+                args["after"],
+                args["wait"],
+                channel=args.get("channel"),
+                exclude=args.get("exclude"),
+            )
+            return {"messages": messages, "last_seq": self.buffer.last_seq}
+
+        if op == "since":
+            messages = await self.buffer.wait_for_messages_since(
+                args["timestamp"],
+                args["wait"],
+                exclude=args.get("exclude"),
+            )
+            return {"messages": messages, "last_seq": self.buffer.last_seq}
+
+        if op == "page_after":
+            return await self.buffer.wait_for_page_after(
+                args["after"],
+                args["wait"],
+                channel=args.get("channel"),
+                exclude=args.get("exclude"),
+            )
+
+        if op == "page_since":
+            return await self.buffer.wait_for_page_since(
+                args["timestamp"],
+                args["wait"],
+                exclude=args.get("exclude"),
+            )
+
+        if op == "add":
+            await self.add_message(
+                args["sender"],
+                args["platform"],
+                args["content"],
+                args.get("channel"),
+                args.get("msg_id"),
+            )
+            return None
+
+        if op == "add_batch":
+            await self.add_messages([tuple(entry) for entry in args["entries"]])
+            return None
+
+        if op == "metrics":
+            return metrics.render()
+
+        if op == "merge_metrics":
+            metrics.merge(args["samples"])
+            return None
+
+        raise ValueError(f"Unknown message broker operation: {op}")
+
+
+class RemoteMessageBuffer:
+    """Message buffer client talking to the relay process's broker.
+
+    Has the read API of MessageBuffer used by the HTTP bridge, plus
+    add_message and add_messages callbacks forwarding received messages
+    to the relay. Connects on first use and reconnects after a failure.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize the client.
+
+        Args:
+            path: Unix socket path of the broker
+
+        """
+        self.path = path
+        self._last_seq = 0
+        # Pushed by the broker, empty until connected
+        self._version = ""
+        self._writer: asyncio.StreamWriter | None = None
+        self._connecting = asyncio.Lock()
+        self._writing = asyncio.Lock()
+        # Request ID -> future resolved with the response
+        self._pending: dict[int, asyncio.Future] = {}
+        self._ids = itertools.count()
+        self._receiver: asyncio.Task | None = None
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence ID of the newest message as of the last response."""
+        return self._last_seq
+
+    @property
+    def version(self) -> str:
+        """Buffer version last pushed by the broker."""
+        return self._version
+
+    async def wait_for_messages_after(
+        self,
+        seq: int,
+        timeout: float,
+        channel: str | None = None,
+        exclude: str | None = None,
+    ) -> list[Message]:
+        """Get messages after the given sequence ID, waiting up to timeout seconds."""
+        result = await self._request(
+            "after",
+            after=seq,
+            wait=timeout,
+            channel=channel,
+            exclude=exclude,
+        )
+        self._last_seq = result["last_seq"]
+        return result["messages"]
+
+    async def wait_for_messages_since(
+        self,
+        timestamp: float,
+        timeout: float,
+        exclude: str | None = None,
+    ) -> list[Message]:
+        """Get messages since the given timestamp, waiting up to timeout seconds."""
+        result = await self._request(
+            "since",
+            timestamp=timestamp,
+            wait=timeout,
+            exclude=exclude,
+        )
+        self._last_seq = result["last_seq"]
+        return result["messages"]
+
+    async def wait_for_page_since(
+        self,
+        timestamp: float,
+        timeout: float,
+        exclude: str | None = None,
+    ) -> EncodedPage:
+        """Like wait_for_messages_since, returning a serialized page."""
+        result = await self._request(
+            "page_since",
+            timestamp=timestamp,
+            wait=timeout,
+            exclude=exclude,
+        )
+        return EncodedPage(**result)
+
+    async def wait_for_page_after(
+        self,
+        seq: int,
+        timeout: float,
+        channel: str | None = None,
+        exclude: str | None = None,
+    ) -> EncodedPage:
+        """Like wait_for_messages_after, returning a serialized page."""
+        result = await self._request(
+            "page_after",
+            after=seq,
+            wait=timeout,
+            channel=channel,
+            exclude=exclude,
+        )
+        return EncodedPage(**result)
+
+    async def add_message(
+        self,
+        sender: str,
+        platform: str,
+        content: str,
+        channel: str | None = None,
+        msg_id: str | None = None,
+    ) -> None:
+        """Hand a received message to the relay."""
+        await self._request(
+            "add",
+            sender=sender,
+            platform=platform,
+            content=content,
+            channel=channel,
+            msg_id=msg_id,
+        )
+
+    async def add_messages(self, entries: list[IncomingEntry]) -> None:
+        """Hand a batch of received messages to the relay."""
+        await self._request("add_batch", entries=entries)
+
+    async def render_metrics(self) -> str:
+        """Metrics of the relay process in the Prometheus text format.
+
+        Samples recorded in this process are pushed first, so the result
+        includes them.
+        """
+        await self.push_metrics()
+        return await self._request("metrics")
+
+    async def push_metrics(self) -> None:
+        """Hand the metrics recorded in this process to the relay."""
+        samples = metrics.drain()
+        if not samples:
+            return
+        try:
+            await self._request("merge_metrics", samples=samples)
+        except Exception:
+            # Keep them for the next push
+            metrics.merge(samples)
+            raise
+
+    async def _request(self, op: str, **args: Any) -> Any:
+        """Send a request and wait for its response."""
+        writer = await self._connect()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            line = json.dumps({"id": request_id, "op": op, "args": args})
+            async with self._writing:
+                writer.write(line.encode() + b"\n")
+                await writer.drain()
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        """Open the broker connection if it is not open."""
+        async with self._connecting:
+            if self._writer is None or self._writer.is_closing():
+                reader, self._writer = await asyncio.open_unix_connection(
+                    self.path,
+                    limit=MAX_LINE_SIZE,
+                )
+                self._receiver = asyncio.create_task(
+                    self._receive(reader, self._writer),
+                )
+            return self._writer
+
+    async def _receive(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        """Resolve pending requests with responses until the connection closes."""
+        try:
+            while line := await reader.readline():
+                response = json.loads(line)
+                if "id" not in response:
+                    # Version push, sent in order so the newest arrives last
+                    self._version = response["version"]
+                    self._last_seq = max(self._last_seq, response["seq"])
+                    continue
+
+                if "body" in response:
+                    # Raw page frame following the line
+                    body = await reader.readexactly(response["body"])
+                    response["result"]["body"] = body
+
+                future = self._pending.get(response["id"])
+                if future is None or future.done():
+                    continue
+                if "error" in response:
+                    future.set_exception(RuntimeError(response["error"]))
+                else:
+                    future.set_result(response["result"])
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"Message broker connection failed: {e}")
+        finally:
+            writer.close()
+            # Unknown until the next connection pushes it, so no stale 304s
+            self._version = ""
+            # The next request reconnects
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(
+                        ConnectionError("Message broker connection closed"),
+                    )
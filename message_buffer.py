@@ -1,48 +1,440 @@
 """Rolling message buffer implementation.
-Maintains a FIFO buffer of the last N messages with timestamp filtering.
+Maintains a FIFO buffer of the last N messages with sequence cursors
+and timestamp filtering. Messages are serialized once when stored, so
+responses can be assembled from cached JSON.
 """
 
+import asyncio
+import bisect
+import contextlib
+import heapq
+import json
 import time
-from collections import deque
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
+from operator import itemgetter
 from types import CoroutineType
-from typing import Any, TypedDict
+from typing import TYPE_CHECKING, Any, NamedTuple, Protocol, TypedDict, TypeVar
 
 import config
 
-AddMessageType = Callable[[str, str, str], CoroutineType[Any, Any, None]]
+if TYPE_CHECKING:
+    from message_journal import MessageJournal
+
+
+class AddMessageType(Protocol):
+    """Callback bridges use to hand a received message to the relay."""
+
+    def __call__(
+        self,
+        sender: str,
+        platform: str,
+        content: str,
+        channel: str | None = None,
+        msg_id: str | None = None,
+    ) -> CoroutineType[Any, Any, None]: ...
+
+
+# Batched messages are (sender, platform, content, client message ID)
+IncomingEntry = tuple[str, str, str, str | None]
+AddMessagesType = Callable[[list[IncomingEntry]], CoroutineType[Any, Any, None]]
 
 
 class Message(TypedDict):
     """Represents a message in the buffer."""
 
+    seq: int
     timestamp: float
     sender: str
     platform: str
     content: str
 
 
+# (seq, JSON bytes) of a message, serialized when it is stored
+EncodedMessage = tuple[int, bytes]
+
+T = TypeVar("T")
+
+
+class EncodedPage(NamedTuple):
+    """Query result as a ready to send JSON array."""
+
+    body: bytes
+    count: int
+    # Seq of the last message, or of the newest in the buffer if none matched
+    cursor: int
+    # Buffer version the result was taken at
+    version: str
+
+
+class MessageRing:
+    """Fixed-capacity ring of messages ordered by sequence ID.
+
+    Supports indexing from oldest to newest, so cursor lookups can
+    binary search instead of scanning. Slots are allocated as messages
+    arrive, so a ring for a rarely used channel stays small.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._slots: list[Message] = []
+        # Serialized form of the message in the same slot
+        self._encoded: list[EncodedMessage] = []
+        self._start = 0
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, index: int) -> Message:
+        if not 0 <= index < self._len:
+            raise IndexError("ring index out of range")
+        return self._slots[(self._start + index) % len(self._slots)]
+
+    def __iter__(self) -> Iterator[Message]:
+        for i in range(self._len):
+            yield self[i]
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence ID of the newest message, or 0 if empty."""
+        return self[self._len - 1]["seq"] if self._len else 0
+
+    def encoded(self, index: int) -> EncodedMessage:
+        """Serialized form of the message at an index."""
+        if not 0 <= index < self._len:
+            raise IndexError("ring index out of range")
+        return self._encoded[(self._start + index) % len(self._encoded)]
+
+    def append(self, message: Message, encoded: EncodedMessage) -> None:
+        """Append a message, overwriting the oldest when full."""
+        if self._len < self.max_size:
+            # Still growing, the ring has not wrapped yet
+            self._slots.append(message)
+            self._encoded.append(encoded)
+            self._len += 1
+            return
+
+        self._slots[self._start] = message
+        self._encoded[self._start] = encoded
+        self._start = (self._start + 1) % self.max_size
+
+    def after(self, seq: int) -> list[Message]:
+        """Get all messages with a sequence ID greater than seq."""
+        return [self[i] for i in range(self._first_after(seq), self._len)]
+
+    def encoded_after(self, seq: int) -> list[EncodedMessage]:
+        """Get the serialized messages with a sequence ID greater than seq."""
+        return [self.encoded(i) for i in range(self._first_after(seq), self._len)]
+
+    def _first_after(self, seq: int) -> int:
+        """Index of the first message with a sequence ID greater than seq."""
+        return bisect.bisect_right(self, seq, key=lambda msg: msg["seq"])
+
+
 class MessageBuffer:
-    """Thread-safe rolling buffer for messages."""
+    """Thread-safe rolling buffer for messages.
+
+    Besides the global ring, every channel (the platform or game server a
+    message came from) keeps its own ring, so a quiet server's history is
+    not evicted by a busy one and queries can skip a caller's own messages.
+    Channel names come from clients, so at most max_channels rings are
+    kept and the least recently active one is dropped to make room.
+    """
+
+    def __init__(
+        self,
+        max_size: int = config.BUFFER_SIZE,
+        channel_size: int = config.CHANNEL_BUFFER_SIZE,
+        max_channels: int = config.MAX_CHANNELS,
+    ) -> None:
+        self._buffer = MessageRing(max_size)
+        self._channel_size = channel_size
+        self._max_channels = max_channels
+        # Ordered from least to most recently active
+        self._channels: dict[str, MessageRing] = {}
+        self._last_seq = 0
+        # Tells this buffer's sequence IDs apart from those of a previous run
+        self._epoch = f"{time.time_ns():x}"
+        self._new_message = asyncio.Event()
+        self._journal: MessageJournal | None = None
 
-    def __init__(self, max_size: int = config.BUFFER_SIZE) -> None:
-        self._buffer: deque[Message] = deque(maxlen=max_size)
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence ID of the newest message, or 0 if none were added."""
+        return self._last_seq
+
+    @property
+    def version(self) -> str:
+        """Identifier that changes whenever a message is added."""
+        return f"{self._epoch}-{self._last_seq}"
+
+    def attach_journal(self, journal: "MessageJournal") -> None:
+        """Replay history from a journal and write new messages through to it."""
+        for message in journal.replay():
+            self._store(message)
+            self._last_seq = max(self._last_seq, message["seq"])
+        self._journal = journal
+
+    def close(self) -> None:
+        """Close the attached journal, if any."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
 
     def add_message(self, sender: str, platform: str, content: str) -> Message:
         """Add a new message to the buffer."""
+        message = self._append(sender, platform, content)
+        if self._journal is not None:
+            self._journal.append([message])
+        self._notify()
+        return message
+
+    def add_messages(self, entries: list[tuple[str, str, str]]) -> list[Message]:
+        """Add a batch of (sender, platform, content) messages in one operation.
+
+        Waiting readers are woken once for the whole batch.
+        """
+        messages = [self._append(*entry) for entry in entries]
+        if messages:
+            if self._journal is not None:
+                self._journal.append(messages)
+            self._notify()
+        return messages
+
+    def _append(self, sender: str, platform: str, content: str) -> Message:
+        """Create a message with the next sequence ID and store it."""
+        self._last_seq += 1
         message = Message(
+            seq=self._last_seq,
             timestamp=time.time(),
             sender=sender,
             platform=platform,
             content=content,
         )
-        self._buffer.append(message)
-
+        self._store(message)
         return message
 
-    def get_messages_since(self, timestamp: float) -> list[Message]:
-        """Get all messages since the given timestamp."""
-        return [msg for msg in self._buffer if msg["timestamp"] > timestamp]
+    def _store(self, message: Message) -> None:
+        """Serialize a message and store it in the global and channel rings."""
+        encoded = (message["seq"], json.dumps(message).encode("utf-8"))
+        self._buffer.append(message, encoded)
+
+        platform = message["platform"]
+        ring = self._channels.pop(platform, None)
+        if ring is None:
+            ring = MessageRing(self._channel_size)
+            if len(self._channels) >= self._max_channels:
+                del self._channels[next(iter(self._channels))]
+        # Reinserting keeps the dict in order of activity
+        self._channels[platform] = ring
+        ring.append(message, encoded)
+
+    def _notify(self) -> None:
+        """Wake waiting readers and arm a fresh event for the next message."""
+        self._new_message.set()
+        self._new_message = asyncio.Event()
+
+    def get_messages_since(
+        self,
+        timestamp: float,
+        exclude: str | None = None,
+    ) -> list[Message]:
+        """Get all messages since the given timestamp.
+
+        Wall clock timestamps are not guaranteed to be ordered, so this
+        scans the whole buffer. Prefer get_messages_after.
+
+        Args:
+            timestamp: Only return messages newer than this
+            exclude: Channel whose messages are left out
+
+        """
+        return [
+            msg
+            for msg in self._buffer
+            if msg["timestamp"] > timestamp and msg["platform"] != exclude
+        ]
+
+    def get_encoded_since(
+        self,
+        timestamp: float,
+        exclude: str | None = None,
+    ) -> list[EncodedMessage]:
+        """Like get_messages_since, returning the serialized messages."""
+        return [
+            self._buffer.encoded(i)
+            for i, msg in enumerate(self._buffer)
+            if msg["timestamp"] > timestamp and msg["platform"] != exclude
+        ]
+
+    def get_messages_after(
+        self,
+        seq: int,
+        channel: str | None = None,
+        exclude: str | None = None,
+    ) -> list[Message]:
+        """Get all messages with a sequence ID greater than seq.
+
+        Args:
+            seq: Cursor, the seq of the last message already seen
+            channel: Only return messages from this channel
+            exclude: Channel whose messages are left out
+
+        """
+        return self._after(
+            seq,
+            channel,
+            exclude,
+            MessageRing.after,
+            lambda msg: msg["seq"],
+        )
+
+    def get_encoded_after(
+        self,
+        seq: int,
+        channel: str | None = None,
+        exclude: str | None = None,
+    ) -> list[EncodedMessage]:
+        """Like get_messages_after, returning the serialized messages."""
+        return self._after(
+            seq,
+            channel,
+            exclude,
+            MessageRing.encoded_after,
+            itemgetter(0),
+        )
+
+    def _after(
+        self,
+        seq: int,
+        channel: str | None,
+        exclude: str | None,
+        ring_after: Callable[[MessageRing, int], list[T]],
+        seq_of: Callable[[T], int],
+    ) -> list[T]:
+        """Select the entries after a cursor from the rings.
+
+        Args:
+            seq: Cursor, the seq of the last message already seen
+            channel: Only return entries from this channel
+            exclude: Channel whose entries are left out
+            ring_after: Ring method returning the entries after a seq
+            seq_of: Sequence ID of an entry, to merge channel rings
+
+        """
+        # Cursors ahead of the newest message come from a previous run
+        if seq > self._last_seq:
+            seq = 0
+
+        if channel is not None:
+            ring = self._channels.get(channel)
+            if ring is None or channel == exclude:
+                return []
+            return ring_after(ring, seq)
+
+        if exclude is None:
+            return ring_after(self._buffer, seq)
+
+        # Only channels with messages past the cursor take part in the merge
+        slices = [
+            ring_after(ring, seq)
+            for name, ring in self._channels.items()
+            if name != exclude and ring.last_seq > seq
+        ]
+        if not slices:
+            return []
+        if len(slices) == 1:
+            return slices[0]
+        return list(heapq.merge(*slices, key=seq_of))
+
+    async def wait_for_messages_since(
+        self,
+        timestamp: float,
+        timeout: float,
+        exclude: str | None = None,
+    ) -> list[Message]:
+        """Get messages since the given timestamp, waiting up to timeout seconds."""
+        return await self._wait_for(
+            lambda: self.get_messages_since(timestamp, exclude=exclude),
+            timeout,
+        )
+
+    async def wait_for_messages_after(
+        self,
+        seq: int,
+        timeout: float,
+        channel: str | None = None,
+        exclude: str | None = None,
+    ) -> list[Message]:
+        """Get messages after the given sequence ID, waiting up to timeout seconds."""
+        return await self._wait_for(
+            lambda: self.get_messages_after(seq, channel=channel, exclude=exclude),
+            timeout,
+        )
+
+    async def wait_for_page_since(
+        self,
+        timestamp: float,
+        timeout: float,
+        exclude: str | None = None,
+    ) -> EncodedPage:
+        """Like wait_for_messages_since, returning a serialized page."""
+        entries = await self._wait_for(
+            lambda: self.get_encoded_since(timestamp, exclude=exclude),
+            timeout,
+        )
+        return self._page(entries)
+
+    async def wait_for_page_after(
+        self,
+        seq: int,
+        timeout: float,
+        channel: str | None = None,
+        exclude: str | None = None,
+    ) -> EncodedPage:
+        """Like wait_for_messages_after, returning a serialized page."""
+        entries = await self._wait_for(
+            lambda: self.get_encoded_after(seq, channel=channel, exclude=exclude),
+            timeout,
+        )
+        return self._page(entries)
+
+    async def wait_for_new_message(self, seq: int) -> None:
+        """Wait until a message newer than seq is added."""
+        while self._last_seq <= seq:
+            await self._new_message.wait()
+
+    def _page(self, entries: list[EncodedMessage]) -> EncodedPage:
+        """Join serialized messages into a JSON array without re-encoding them."""
+        return EncodedPage(
+            body=b"[" + b",".join(data for _, data in entries) + b"]",
+            count=len(entries),
+            cursor=entries[-1][0] if entries else self._last_seq,
+            version=self.version,
+        )
+
+    async def _wait_for(
+        self,
+        fetch: Callable[[], list[T]],
+        timeout: float,
+    ) -> list[T]:
+        """Call fetch until it returns messages or the timeout elapses.
+
+        Returns as soon as a newer message is available, or an empty list
+        once the timeout elapses.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            messages = fetch()
+            remaining = deadline - time.monotonic()
+            if messages or remaining <= 0:
+                return messages
+
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._new_message.wait(), remaining)
 
 
 # Global buffer instance
@@ -0,0 +1,218 @@
+"""Append-only on-disk journal for the message buffer.
+Messages are written as JSON lines into numbered segment files, fsynced in
+batches, and replayed at startup so a restart does not lose history. Writes
+and fsyncs happen on a background thread, never on the event loop.
+"""
+
+import json
+import logging
+import mmap
+import os
+import queue
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import IO
+
+import config
+from message_buffer import Message
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".journal"
+
+
+class MessageJournal:
+    """Segmented append-only journal of buffered messages."""
+
+    def __init__(
+        self,
+        path: str,
+        keep: int = config.JOURNAL_KEEP,
+        segment_bytes: int = config.JOURNAL_SEGMENT_BYTES,
+        fsync_interval: float = config.JOURNAL_FSYNC_INTERVAL,
+    ) -> None:
+        """Initialize the journal.
+
+        Args:
+            path: Directory holding the segment files
+            keep: Number of most recent messages retained by compaction
+            segment_bytes: Size after which a new segment is started
+            fsync_interval: Maximum seconds between fsyncs of written data
+
+        """
+        self.path = Path(path)
+        self.keep = keep
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+
+        # Message count of every live segment, oldest first
+        self._segments: dict[Path, int] = {}
+        self._file: IO[bytes] | None = None
+        self._last_fsync = time.monotonic()
+        # Batches for the writer thread, None asks it to finish
+        self._queue: queue.SimpleQueue[list[Message] | None] = queue.SimpleQueue()
+        self._writer: threading.Thread | None = None
+
+    def replay(self) -> list[Message]:
+        """Read the newest messages back and compact the journal to them.
+
+        Only the tail needed to fill keep messages is parsed, scanning
+        memory-mapped segments backwards from the newest. Records not older
+        than the last one kept are skipped, so a tail copied by an
+        interrupted compaction is not replayed twice.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        old_segments = sorted(self.path.glob(f"*{SEGMENT_SUFFIX}"))
+
+        messages: list[Message] = []
+        for segment in reversed(old_segments):
+            for line in self._lines_backwards(segment):
+                try:
+                    message = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # Torn write from a crash
+                    logger.warning("Skipping corrupt journal record")
+                    continue
+                if messages and message["seq"] >= messages[-1]["seq"]:
+                    continue
+                messages.append(message)
+                if len(messages) >= self.keep:
+                    break
+            if len(messages) >= self.keep:
+                break
+        messages.reverse()
+
+        # Rewrite the surviving tail into a fresh segment before dropping
+        # the old ones, so a crash here never loses data. Until the old ones
+        # are gone the tail is on disk twice, which the scan above skips.
+        self._open_segment(self._next_index(old_segments))
+        self._write(messages)
+        self._fsync()
+        for segment in old_segments:
+            segment.unlink()
+
+        self._writer = threading.Thread(
+            target=self._run,
+            name="message-journal",
+            daemon=True,
+        )
+        self._writer.start()
+
+        logger.info(f"Replayed {len(messages)} messages from journal {self.path}")
+        return messages
+
+    def append(self, messages: list[Message]) -> None:
+        """Queue messages to be written through to the journal."""
+        if self._writer is None:
+            self.replay()
+
+        if messages:
+            self._queue.put(messages)
+
+    def close(self) -> None:
+        """Write queued messages, then fsync and close the current segment."""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+        if self._file is not None:
+            self._fsync()
+            self._file.close()
+            self._file = None
+
+    def _run(self) -> None:
+        """Writer thread: write queued batches and fsync them in batches."""
+        dirty = False
+        while True:
+            timeout = None
+            if dirty:
+                deadline = self._last_fsync + self.fsync_interval
+                timeout = max(0.0, deadline - time.monotonic())
+
+            try:
+                messages = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                # Nothing more arrived within the interval
+                messages = []
+
+            if messages is None:
+                return
+
+            try:
+                self._write(messages)
+                dirty = dirty or bool(messages)
+
+                if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                    self._fsync()
+                    dirty = False
+
+                if self._file.tell() >= self.segment_bytes:
+                    self._fsync()
+                    dirty = False
+                    self._open_segment(self._next_index(list(self._segments)))
+                    self._compact()
+            except OSError as e:
+                logger.exception(f"Error writing message journal: {e}")
+
+    def _write(self, messages: list[Message]) -> None:
+        """Append messages to the current segment and hand them to the OS."""
+        if not messages:
+            return
+
+        self._file.write(
+            b"".join(json.dumps(msg).encode("utf-8") + b"\n" for msg in messages),
+        )
+        self._file.flush()
+        self._segments[Path(self._file.name)] += len(messages)
+
+    def _fsync(self) -> None:
+        """Force written data to disk."""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+
+    def _open_segment(self, index: int) -> None:
+        """Close the current segment and start a new one."""
+        if self._file is not None:
+            self._file.close()
+
+        segment = self.path / f"{index:08d}{SEGMENT_SUFFIX}"
+        self._file = segment.open("ab")
+        self._segments[segment] = 0
+
+    def _compact(self) -> None:
+        """Delete the oldest segments no longer needed to hold keep messages."""
+        segments = list(self._segments)
+        retained = sum(self._segments.values())
+        for segment in segments[:-1]:
+            if retained - self._segments[segment] < self.keep:
+                break
+            retained -= self._segments.pop(segment)
+            segment.unlink(missing_ok=True)
+
+    @staticmethod
+    def _next_index(segments: list[Path]) -> int:
+        """Number for the segment following the given ones."""
+        if not segments:
+            return 0
+        return int(segments[-1].stem) + 1
+
+    @staticmethod
+    def _lines_backwards(segment: Path) -> Iterator[bytes]:
+        """Yield the lines of a segment from newest to oldest."""
+        with segment.open("rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                return
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                end = len(mm)
+                while end > 0:
+                    start = mm.rfind(b"\n", 0, end - 1) + 1
+                    line = mm[start:end].strip()
+                    if line:
+                        yield line
+                    end = start
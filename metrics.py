@@ -0,0 +1,292 @@
+"""Relay metrics in the Prometheus text format.
+Counters and histograms are plain dict and list updates on the event loop
+thread, cheap enough to stay on in production without locks. Other
+processes hand their samples over with drain and merge.
+"""
+
+import bisect
+from collections.abc import Callable
+
+import config
+
+LabelValues = tuple[str, ...]
+
+# Stands in for label values seen after a metric reached its series limit
+OTHER_LABEL = "other"
+
+# Metric name -> JSON-friendly [label values, ...values] entries
+Samples = dict[str, list[list]]
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+_registry: list["Counter | Histogram | CallbackMetric"] = []
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues) -> str:
+    """Format label pairs as {name="value",...}."""
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"'
+        for name, value in zip(names, values, strict=True)
+    )
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text format."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels.
+
+    Label values that come from clients should set max_series, so new
+    values past the limit are counted under OTHER_LABEL instead of adding
+    series without bound.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        max_series: int | None = None,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.max_series = max_series
+        self._values: dict[LabelValues, float] = {}
+        _registry.append(self)
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        """Add to the count for the given label values."""
+        if (
+            self.max_series is not None
+            and label_values not in self._values
+            and len(self._values) >= self.max_series
+        ):
+            label_values = (OTHER_LABEL,) * len(label_values)
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def drain(self) -> list[list]:
+        """Take the counts recorded so far, resetting them."""
+        entries = [[list(values), value] for values, value in self._values.items()]
+        self._values.clear()
+        return entries
+
+    def merge(self, entries: list[list]) -> None:
+        """Add counts drained from another process."""
+        for values, value in entries:
+            self.inc(*values, amount=value)
+
+    def render(self) -> list[str]:
+        """Exposition lines for this counter."""
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} counter",
+        ]
+        lines += [
+            f"{self.name}{_format_labels(self.labels, values)} {value}"
+            for values, value in self._values.items()
+        ]
+        return lines
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        labels: tuple[str, ...] = (),
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        # Label values -> [per-bucket counts..., +Inf count], sum
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """Record one observation."""
+        counts = self._counts.get(label_values)
+        if counts is None:
+            counts = self._counts[label_values] = [0] * (len(self.buckets) + 1)
+            self._sums[label_values] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[label_values] += value
+
+    def drain(self) -> list[list]:
+        """Take the observations recorded so far, resetting them."""
+        entries = [
+            [list(values), counts, self._sums[values]]
+            for values, counts in self._counts.items()
+        ]
+        self._counts.clear()
+        self._sums.clear()
+        return entries
+
+    def merge(self, entries: list[list]) -> None:
+        """Add observations drained from another process."""
+        for values, counts, total in entries:
+            label_values = tuple(values)
+            current = self._counts.get(label_values)
+            if current is None:
+                current = self._counts[label_values] = [0] * (len(self.buckets) + 1)
+                self._sums[label_values] = 0.0
+            for i, count in enumerate(counts):
+                current[i] += count
+            self._sums[label_values] += total
+
+    def render(self) -> list[str]:
+        """Exposition lines for this histogram, with cumulative buckets."""
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        label_names = (*self.labels, "le")
+        for values, counts in self._counts.items():
+            total = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts, strict=True):
+                total += count
+                labels = _format_labels(label_names, (*values, str(bound)))
+                lines.append(f"{self.name}_bucket{labels} {total}")
+            labels = _format_labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {self._sums[values]}")
+            lines.append(f"{self.name}_count{labels} {total}")
+        return lines
+
+
+class CallbackMetric:
+    """Metric whose values are read from a callback at scrape time."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        collect: Callable[[], dict[LabelValues, float]],
+        labels: tuple[str, ...] = (),
+        kind: str = "gauge",
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.collect = collect
+        self.labels = labels
+        self.kind = kind
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        """Exposition lines for the current callback values."""
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines += [
+            f"{self.name}{_format_labels(self.labels, values)} {value}"
+            for values, value in self.collect().items()
+        ]
+        return lines
+
+
+def unregister(metric: "Counter | Histogram | CallbackMetric") -> None:
+    """Remove a metric from the exposition."""
+    if metric in _registry:
+        _registry.remove(metric)
+
+
+def drain() -> Samples:
+    """Take the counter and histogram samples recorded in this process."""
+    samples: Samples = {}
+    for metric in _registry:
+        if isinstance(metric, Counter | Histogram) and (entries := metric.drain()):
+            samples[metric.name] = entries
+    return samples
+
+
+def merge(samples: Samples) -> None:
+    """Add samples drained from another process to the matching metrics."""
+    by_name = {metric.name: metric for metric in _registry}
+    for name, entries in samples.items():
+        metric = by_name.get(name)
+        if isinstance(metric, Counter | Histogram):
+            metric.merge(entries)
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text format."""
+    lines: list[str] = []
+    for metric in _registry:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+INGRESS_MESSAGES = Counter(
+    "relay_ingress_messages_total",
+    "Messages received by the relay",
+    ("platform",),
+    max_series=config.INGRESS_MAX_PLATFORM_LABELS,
+)
+ADD_MESSAGE_SECONDS = Histogram(
+    "relay_add_message_seconds",
+    "Time spent buffering and routing received messages",
+)
+POST_SECONDS = Histogram(
+    "relay_post_seconds",
+    "Time spent delivering to a destination bridge",
+    labels=("destination",),
+)
+POST_FAILURES = Counter(
+    "relay_post_failures_total",
+    "Failed deliveries to a destination bridge",
+    ("destination",),
+)
+POST_MESSAGES = Counter(
+    "relay_post_messages_total",
+    "Messages delivered to a destination bridge",
+    ("destination",),
+)
+OUTBOX_DEAD_LETTERS = Counter(
+    "relay_outbox_dead_letters_total",
+    "Messages given up on after OUTBOX_MAX_ATTEMPTS failed deliveries",
+    ("destination",),
+)
+POLLS = Counter(
+    "relay_polls_total",
+    "GET /messages requests served",
+)
+POLLS_NOT_MODIFIED = Counter(
+    "relay_polls_not_modified_total",
+    "GET /messages requests answered with 304 Not Modified",
+)
+POLL_RESULT_MESSAGES = Histogram(
+    "relay_poll_result_messages",
+    "Messages returned per GET /messages request",
+    SIZE_BUCKETS,
+)
+SCTP_ERRORS = Counter(
+    "relay_sctp_errors_total",
+    "SCTP receive errors",
+    ("kind",),
+)
@@ -0,0 +1,261 @@
+"""Per-bridge outbound queue implementation.
+Decouples message ingress from slow or failing platform sends, retrying
+undelivered messages and optionally persisting them in SQLite.
+"""
+
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import random
+import sqlite3
+import time
+from collections import deque
+from collections.abc import Callable
+from types import CoroutineType
+from typing import Any
+
+import config
+import metrics
+from message_buffer import Message
+
+logger = logging.getLogger(__name__)
+
+PostMessageType = Callable[[str, str, str], CoroutineType[Any, Any, bool]]
+# Batch senders return how many leading messages were delivered
+PostMessagesType = Callable[[list[Message]], CoroutineType[Any, Any, int]]
+
+
+class OutboundQueue:
+    """Bounded outbox with a worker task delivering messages to one bridge.
+
+    A single worker delivers the oldest message first and retries it with
+    jittered exponential backoff, so each platform sees messages in order
+    and catches up at full speed once it recovers. A message still failing
+    after OUTBOX_MAX_ATTEMPTS is moved aside as a dead letter, so one the
+    platform will never accept does not hold up the rest.
+
+    Bridges that can coalesce messages provide post_messages, which is
+    handed up to OUTBOUND_BATCH_SIZE pending messages at a time, and
+    batch_delay, which says how long to wait for more before sending.
+    """
+
+    def __init__(
+        self,
+        label: str,
+        post_message: PostMessageType,
+        post_messages: PostMessagesType | None = None,
+        batch_delay: Callable[[int], float] | None = None,
+        max_size: int = config.OUTBOUND_QUEUE_SIZE,
+        db_path: str = config.OUTBOX_PATH,
+    ) -> None:
+        """Initialize the outbound queue.
+
+        Args:
+            label: Human readable name of the destination bridge
+            post_message: Bridge coroutine used to deliver a message
+            post_messages: Bridge coroutine used to deliver a batch
+            batch_delay: Seconds to wait for more messages given the
+                number currently pending
+            max_size: Maximum number of pending messages
+            db_path: SQLite database persisting pending messages, empty to
+                keep them in memory only
+
+        """
+        self.label = label
+        self.post_message = post_message
+        self.post_messages = post_messages
+        self.batch_delay = batch_delay
+        self.max_size = max_size
+        # Pending (row ID, message) pairs, oldest first
+        self._pending: deque[tuple[int, Message]] = deque()
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self._next_id = 0
+        self._db: sqlite3.Connection | None = None
+
+        if db_path:
+            self._open_db(db_path)
+
+    @property
+    def depth(self) -> int:
+        """Number of messages waiting to be delivered."""
+        return len(self._pending)
+
+    def start(self) -> None:
+        """Start the worker task."""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    def put(self, message: Message) -> None:
+        """Queue a message without waiting.
+
+        When the queue is full the oldest pending message is dropped,
+        keeping the most recent conversation flowing.
+        """
+        if len(self._pending) >= self.max_size:
+            row_id, _ = self._pending.popleft()
+            self._delete(row_id)
+            logger.warning("%s outbound queue full, dropped oldest message", self.label)
+
+        if self._db is not None:
+            cursor = self._db.execute(
+                "INSERT INTO outbox (destination, message) VALUES (?, ?)",
+                (self.label, json.dumps(message)),
+            )
+            row_id = cursor.lastrowid
+        else:
+            self._next_id += 1
+            row_id = self._next_id
+
+        self._pending.append((row_id, message))
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        """Deliver queued messages in order, retrying failures."""
+        attempt = 0
+        while True:
+            while not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            if self.post_messages is not None:
+                if self.batch_delay is not None:
+                    delay = self.batch_delay(len(self._pending))
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                batch = list(
+                    itertools.islice(self._pending, config.OUTBOUND_BATCH_SIZE),
+                )
+            else:
+                batch = [self._pending[0]]
+
+            delivered = await self._deliver(batch)
+            for item in batch[:delivered]:
+                # The head may have been dropped while it was being sent
+                if self._pending and self._pending[0] is item:
+                    self._pending.popleft()
+                self._delete(item[0])
+
+            if delivered == len(batch):
+                attempt = 0
+                continue
+
+            # A delivered prefix means a new head with fresh attempts
+            if delivered:
+                attempt = 0
+            attempt += 1
+            if 0 < config.OUTBOX_MAX_ATTEMPTS <= attempt:
+                self._dead_letter(batch[delivered])
+                attempt = 0
+                continue
+
+            delay = self._backoff(attempt - 1)
+            logger.warning(
+                f"Retrying {self.label} delivery in {delay:.1f}s "
+                f"({self.depth} messages pending)",
+            )
+            await asyncio.sleep(delay)
+
+    async def _deliver(self, batch: list[tuple[int, Message]]) -> int:
+        """Send pending messages to the bridge, returning how many were delivered."""
+        messages = [message for _, message in batch]
+        started = time.perf_counter()
+        try:
+            if self.post_messages is not None:
+                delivered = await self.post_messages(messages)
+            else:
+                message = messages[0]
+                success = await self.post_message(
+                    message["sender"],
+                    message["platform"],
+                    message["content"],
+                )
+                delivered = 1 if success else 0
+        except Exception as e:
+            logger.exception(f"Error relaying to {self.label}: {e}")
+            metrics.POST_FAILURES.inc(self.label)
+            return 0
+        finally:
+            metrics.POST_SECONDS.observe(time.perf_counter() - started, self.label)
+
+        metrics.POST_MESSAGES.inc(self.label, amount=delivered)
+        if delivered == len(messages):
+            logger.debug("Successfully relayed to %s", self.label)
+        else:
+            logger.warning("Failed to relay message to %s", self.label)
+            metrics.POST_FAILURES.inc(self.label)
+        return delivered
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Jittered exponential backoff delay for the given retry attempt."""
+        delay = min(config.OUTBOX_RETRY_MAX, config.OUTBOX_RETRY_BASE * 2**attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _open_db(self, db_path: str) -> None:
+        """Open the outbox database and load messages left from a previous run."""
+        self._db = sqlite3.connect(db_path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "destination TEXT NOT NULL, "
+            "message TEXT NOT NULL)",
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letter ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "destination TEXT NOT NULL, "
+            "message TEXT NOT NULL, "
+            "failed_at REAL NOT NULL)",
+        )
+
+        rows = self._db.execute(
+            "SELECT id, message FROM outbox WHERE destination = ? ORDER BY id",
+            (self.label,),
+        ).fetchall()
+        for row_id, message in rows:
+            self._pending.append((row_id, json.loads(message)))
+
+        if rows:
+            logger.info(f"Loaded {len(rows)} undelivered {self.label} messages")
+            self._wakeup.set()
+
+    def _dead_letter(self, item: tuple[int, Message]) -> None:
+        """Give up on a message, keeping it in the dead_letter table."""
+        row_id, message = item
+        if self._pending and self._pending[0] is item:
+            self._pending.popleft()
+
+        if self._db is not None:
+            self._db.execute(
+                "INSERT INTO dead_letter (destination, message, failed_at) "
+                "VALUES (?, ?, ?)",
+                (self.label, json.dumps(message), time.time()),
+            )
+            self._delete(row_id)
+
+        metrics.OUTBOX_DEAD_LETTERS.inc(self.label)
+        logger.warning(
+            f"Giving up on {self.label} delivery of message {message['seq']} "
+            f"after {config.OUTBOX_MAX_ATTEMPTS} attempts",
+        )
+
+    def _delete(self, row_id: int) -> None:
+        """Remove a delivered or dropped message from the database."""
+        if self._db is not None:
+            self._db.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+
+    async def stop(self) -> None:
+        """Stop the worker task, leaving undelivered messages in the outbox."""
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._worker
+
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,270 @@
+"""Rate limiting primitives.
+Token buckets used to pace outbound platform sends, and an ingress limiter
+shedding load from senders or sources that push messages too fast.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from collections.abc import Awaitable, Callable
+
+import config
+import metrics
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket refilling continuously at a fixed rate."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """Initialize the bucket full.
+
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum number of tokens held
+
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    @property
+    def tokens(self) -> float:
+        """Tokens currently available."""
+        self._refill()
+        return self._tokens
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens if they are available now."""
+        self._refill()
+        if self._tokens < tokens:
+            return False
+        self._tokens -= tokens
+        return True
+
+    def time_until(self, tokens: float = 1.0) -> float:
+        """Seconds until the given number of tokens will be available."""
+        self._refill()
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """Wait until tokens are available, then take them."""
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.time_until(tokens))
+
+    def _refill(self) -> None:
+        """Add the tokens accrued since the last update."""
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated) * self.rate,
+        )
+        self._updated = now
+
+
+class IngressLimiter:
+    """Token bucket limits per (platform, sender) and per source platform.
+
+    Messages over the limit are handled by policy: "drop" discards them,
+    "delay" queues them for up to INGRESS_MAX_DELAY until there is a
+    token, and "collapse" queues them too but folds repeats of the same
+    line into one "line (xN)". Queued messages are emitted in order by a
+    task per sender, never on the ingress path. A rate of 0 disables that
+    limit.
+    """
+
+    def __init__(
+        self,
+        emit: Callable[[str, str, str, str | None], Awaitable[None]],
+        policy: str = config.INGRESS_POLICY,
+    ) -> None:
+        """Initialize the limiter.
+
+        Args:
+            emit: Coroutine adding a queued message once it is allowed,
+                called with sender, platform, content and channel
+            policy: "drop", "delay" or "collapse"
+
+        """
+        self.emit = emit
+        self.policy = policy
+        # Idle buckets are evicted, they would have refilled anyway
+        self._sender_buckets: TTLCache[tuple[str, str], TokenBucket] = TTLCache(
+            config.INGRESS_MAX_KEYS,
+            config.INGRESS_IDLE_SECONDS,
+        )
+        self._source_buckets: TTLCache[str, TokenBucket] = TTLCache(
+            config.INGRESS_MAX_KEYS,
+            config.INGRESS_IDLE_SECONDS,
+        )
+        # (platform, sender) -> [content, repeat count, channel] awaiting a token
+        self._pending: dict[tuple[str, str], deque[list]] = {}
+        self._flushes: set[asyncio.Task] = set()
+        # (platform, outcome) -> messages shed, platforms bounded like metrics
+        self.shed: Counter[tuple[str, str]] = Counter()
+        self._shed_platforms: set[str] = set()
+
+    def admit(
+        self,
+        sender: str,
+        platform: str,
+        content: str,
+        channel: str | None = None,
+    ) -> bool:
+        """Whether a message may be added now.
+
+        Messages over the limit are dropped, or queued and emitted later
+        according to the policy. A sender's messages stay in order, so
+        while some are queued the next ones queue behind them.
+        """
+        key = (platform, sender)
+        buckets = self._buckets(sender, platform)
+        queue = self._pending.get(key)
+        if queue is None and self._take(buckets):
+            return True
+
+        if self.policy == "drop":
+            outcome = "dropped"
+        elif self.policy == "collapse":
+            outcome = self._collapse(key, content, channel, buckets)
+        else:
+            outcome = self._delay(key, content, channel, buckets)
+
+        if outcome:
+            self._count_shed(platform, outcome)
+            logger.debug("Rate limited message from %s (%s)", sender, platform)
+        return False
+
+    def stop(self) -> None:
+        """Cancel queued messages."""
+        for task in self._flushes:
+            task.cancel()
+
+    def _buckets(self, sender: str, platform: str) -> list[TokenBucket]:
+        """Get the buckets that apply to a message, creating them as needed."""
+        buckets = []
+        if config.INGRESS_SENDER_RATE > 0:
+            key = (platform, sender)
+            bucket = self._sender_buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(
+                    config.INGRESS_SENDER_RATE,
+                    config.INGRESS_SENDER_BURST,
+                )
+            self._sender_buckets.set(key, bucket)
+            buckets.append(bucket)
+
+        if config.INGRESS_SOURCE_RATE > 0:
+            bucket = self._source_buckets.get(platform)
+            if bucket is None:
+                bucket = TokenBucket(
+                    config.INGRESS_SOURCE_RATE,
+                    config.INGRESS_SOURCE_BURST,
+                )
+            self._source_buckets.set(platform, bucket)
+            buckets.append(bucket)
+
+        return buckets
+
+    @staticmethod
+    def _take(buckets: list[TokenBucket]) -> bool:
+        """Take a token from every bucket, or from none if any is empty."""
+        if any(bucket.tokens < 1 for bucket in buckets):
+            return False
+        for bucket in buckets:
+            bucket.try_acquire()
+        return True
+
+    def _count_shed(self, platform: str, outcome: str) -> None:
+        """Count a shed message, past the label limit under OTHER_LABEL."""
+        if platform not in self._shed_platforms:
+            if len(self._shed_platforms) >= config.INGRESS_MAX_PLATFORM_LABELS:
+                platform = metrics.OTHER_LABEL
+            else:
+                self._shed_platforms.add(platform)
+        self.shed[platform, outcome] += 1
+
+    def _delay(
+        self,
+        key: tuple[str, str],
+        content: str,
+        channel: str | None,
+        buckets: list[TokenBucket],
+    ) -> str | None:
+        """Queue a limited message if its turn comes within INGRESS_MAX_DELAY.
+
+        Returns the shed outcome, or None if the message was queued.
+        """
+        queued = len(self._pending.get(key, ()))
+        wait = max(bucket.time_until(queued + 1) for bucket in buckets)
+        if wait > config.INGRESS_MAX_DELAY:
+            return "dropped"
+        self._enqueue(key, content, channel, buckets)
+        return None
+
+    def _collapse(
+        self,
+        key: tuple[str, str],
+        content: str,
+        channel: str | None,
+        buckets: list[TokenBucket],
+    ) -> str | None:
+        """Fold a limited message into the sender's last queued line, or queue it.
+
+        Returns the shed outcome, or None if the message was queued.
+        """
+        queue = self._pending.get(key)
+        if queue and queue[-1][0] == content:
+            queue[-1][1] += 1
+            queue[-1][2] = channel
+            return "collapsed"
+        if queue is not None and len(queue) >= config.INGRESS_MAX_PENDING:
+            return "dropped"
+        self._enqueue(key, content, channel, buckets)
+        return None
+
+    def _enqueue(
+        self,
+        key: tuple[str, str],
+        content: str,
+        channel: str | None,
+        buckets: list[TokenBucket],
+    ) -> None:
+        """Queue a message, starting the sender's flush task if needed."""
+        queue = self._pending.get(key)
+        if queue is None:
+            queue = self._pending[key] = deque()
+            task = asyncio.create_task(self._flush(key, queue, buckets))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        queue.append([content, 1, channel])
+
+    async def _flush(
+        self,
+        key: tuple[str, str],
+        queue: deque[list],
+        buckets: list[TokenBucket],
+    ) -> None:
+        """Emit a sender's queued messages as tokens become available."""
+        platform, sender = key
+        try:
+            while queue:
+                while not self._take(buckets):
+                    await asyncio.sleep(
+                        max(bucket.time_until() for bucket in buckets),
+                    )
+
+                content, count, channel = queue.popleft()
+                if count > 1:
+                    content = f"{content} (x{count})"
+
+                try:
+                    await self.emit(sender, platform, content, channel)
+                except Exception as e:
+                    logger.exception(f"Error adding queued message: {e}")
+        finally:
+            del self._pending[key]
@@ -0,0 +1,79 @@
+"""Logging setup for the chat relay.
+Records are queued by the event loop and formatted and written by a
+background thread. Per-message lines go through a sampled logger.
+"""
+
+import atexit
+import itertools
+import logging
+import logging.handlers
+import queue
+
+import config
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Received and relayed message lines, sampled by LOG_MESSAGE_SAMPLE_EVERY
+message_logger = logging.getLogger("chat_relay.messages")
+
+
+class SampleFilter(logging.Filter):
+    """Pass one record in every N, or none when N is 0."""
+
+    def __init__(self, every: int) -> None:
+        super().__init__()
+        self.every = every
+        self._count = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every <= 0:
+            return False
+        return next(self._count) % self.every == 0
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler leaving all formatting to the listener thread.
+
+    The stock handler merges the message and arguments before queueing.
+    The queue never leaves the process, so records are passed as is and
+    callers must log immutable arguments, as the hot path does.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure(
+    level: str = config.LOG_LEVEL,
+    use_queue: bool = config.LOG_ASYNC,
+) -> None:
+    """Set up root logging, doing nothing if handlers are already installed.
+
+    Args:
+        level: Root log level name
+        use_queue: Write records from a background thread
+
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return
+
+    root.setLevel(level)
+    message_logger.addFilter(SampleFilter(config.LOG_MESSAGE_SAMPLE_EVERY))
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    if not use_queue:
+        root.addHandler(handler)
+        return
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue,
+        handler,
+        respect_handler_level=True,
+    )
+    root.addHandler(DeferredQueueHandler(log_queue))
+    listener.start()
+    # Flush queued records on exit
+    atexit.register(listener.stop)
@@ -0,0 +1,135 @@
+"""Message routing table.
+Compiles the declarative ROUTES config into hash lookups deciding which
+channels are read and which bridges each message is relayed to.
+"""
+
+import re
+from typing import Any
+
+import config
+
+# Matches any source platform, or any channel of a platform
+WILDCARD = "*"
+
+# Platforms of the chat bridges, as opposed to game server names
+CHAT_PLATFORMS = ("discord", "matrix")
+
+RouteKey = tuple[str, str]
+
+
+class RoutingTable:
+    """Compiled routes from (platform, channel) sources to destination bridges.
+
+    Game servers use their server name as platform and have no channel.
+    The platform wildcard only stands in for sources without a rule of
+    their own. Which chat channels are read is decided separately: only
+    channels named explicitly by a route are inputs, wildcard rules never
+    make a channel readable.
+    """
+
+    def __init__(self, routes: list[dict[str, Any]]) -> None:
+        """Compile routes.
+
+        Args:
+            routes: Dicts with a source platform, optional channel, the
+                destination bridge names in to, and an optional match
+                regex the content must contain for the route to apply
+
+        """
+        unfiltered: dict[RouteKey, set[str]] = {}
+        filtered: dict[RouteKey, list[tuple[re.Pattern[str], frozenset[str]]]] = {}
+
+        for route in routes:
+            key = (route["platform"], route.get("channel") or WILDCARD)
+            destinations = frozenset(route.get("to", ()))
+            unfiltered.setdefault(key, set())
+            if route.get("match"):
+                filtered.setdefault(key, []).append(
+                    (re.compile(route["match"]), destinations),
+                )
+            else:
+                unfiltered[key] |= destinations
+
+        self._table: dict[
+            RouteKey,
+            tuple[frozenset[str], tuple[tuple[re.Pattern[str], frozenset[str]], ...]],
+        ] = {
+            key: (frozenset(dests), tuple(filtered.get(key, ())))
+            for key, dests in unfiltered.items()
+        }
+        self._inputs: set[RouteKey] = {
+            key for key in self._table if WILDCARD not in key
+        }
+
+    @classmethod
+    def from_config(cls) -> "RoutingTable":
+        """Build the table from config.ROUTES, or from the channel lists if unset.
+
+        Messages claiming a chat platform without naming a routed channel,
+        such as a game server posting as "discord", are dropped unless a
+        route covers the whole platform.
+        """
+        routes: list[dict[str, Any]] = list(config.ROUTES)
+        if not routes:
+            # Chat channels are read into the buffer only; game servers go
+            # everywhere
+            routes = [
+                {"platform": "discord", "channel": channel, "to": []}
+                for channel in config.DISCORD_INPUT_CHANNELS
+                if channel
+            ]
+            routes += [
+                {"platform": "matrix", "channel": room_id, "to": []}
+                for room_id in config.MATRIX_INPUT_CHANNELS
+                if room_id
+            ]
+            routes.append({"platform": WILDCARD, "to": ["discord", "matrix"]})
+
+        covered = {route["platform"] for route in routes if not route.get("channel")}
+        routes += [
+            {"platform": platform, "to": []}
+            for platform in CHAT_PLATFORMS
+            if platform not in covered
+        ]
+        return cls(routes)
+
+    def is_input(self, platform: str, channel: str) -> bool:
+        """Whether messages from this platform channel should be read."""
+        return (platform, channel) in self._inputs
+
+    def input_channels(self, platform: str) -> list[str]:
+        """Channels explicitly routed from a platform."""
+        return [
+            channel
+            for source, channel in self._inputs
+            if source == platform and channel != WILDCARD
+        ]
+
+    def destinations(
+        self,
+        platform: str,
+        channel: str | None,
+        content: str,
+    ) -> frozenset[str]:
+        """Bridges a message should be relayed to."""
+        entry = (
+            self._table.get((platform, channel or WILDCARD))
+            or self._table.get((platform, WILDCARD))
+            or self._table.get((WILDCARD, WILDCARD))
+        )
+        if entry is None:
+            return frozenset()
+
+        destinations, filtered = entry
+        if not filtered:
+            return destinations
+
+        matched = set(destinations)
+        for pattern, extra in filtered:
+            if pattern.search(content):
+                matched |= extra
+        return frozenset(matched)
+
+
+# Global routing table
+routing_table = RoutingTable.from_config()
@@ -1,8 +1,10 @@
 """SCTP API implementation using asyncio and pysctp.
-Receives messages from SCTP socket and calls back with add_message.
+Receives messages from SCTP socket and calls back with add_messages.
+A frame carries one or more newline-delimited JSON messages.
 """
 
 import asyncio
+import contextlib
 import json
 import logging
 import socket
@@ -10,65 +12,155 @@ import socket
 import sctp
 
 import config
-from message_buffer import AddMessageType
+import metrics
+from message_buffer import AddMessagesType, AddMessageType, IncomingEntry
+from relay_logging import message_logger
 
 logger = logging.getLogger(__name__)
 
+# Large enough for a tick's worth of batched chat lines
+MAX_FRAME_SIZE = 65536
+
 
 class SCTPBridge:
     """SCTP bridge for receiving messages and forwarding them via callback."""
 
-    def __init__(self, add_message: AddMessageType) -> None:
+    def __init__(
+        self,
+        add_message: AddMessageType,
+        add_messages: AddMessagesType | None = None,
+    ) -> None:
         """Initialize the SCTP bridge.
 
         Args:
             add_message: Callback when a new message is received
+            add_messages: Callback for a batch of messages, defaults to
+                calling add_message for each
 
         """
         self.add_message = add_message
+        self.add_messages = add_messages or self._add_each
+        # Bound by start, so constructing the bridge has no side effects
+        self.sock: sctp.sctpsocket_udp | None = None
+        # Set once the socket is bound
+        self.ready = asyncio.Event()
+
+    async def start(self) -> None:
+        """Bind the socket and handle incoming messages until stopped."""
         # Create SCTP UDP-style socket
         self.sock = sctp.sctpsocket_udp(socket.AF_INET)
         self.sock.bind((config.API_HOST, config.API_PORT))
         self.sock.listen(10)
         self.sock.setblocking(False)
+        self.ready.set()
+        await self.listen()
 
     async def listen(self) -> None:
-        """Handle incoming SCTP messages."""
+        """Handle incoming SCTP messages.
+
+        Waits for the event loop to report the socket readable, then drains
+        every pending datagram before waiting again.
+        """
         logger.info(f"SCTP bridge listening on {config.API_HOST}:{config.API_PORT}")
 
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        fd = self.sock.fileno()
+        loop.add_reader(fd, readable.set)
+
+        try:
+            while True:
+                await readable.wait()
+                readable.clear()
+                await self._drain()
+
+        except (asyncio.CancelledError, OSError):
+            # Proper asyncio cleanup
+            pass
+
+        except KeyboardInterrupt:
+            # User interruption
+            pass
+
+        finally:
+            with contextlib.suppress(Exception):
+                loop.remove_reader(fd)
+
+    async def _drain(self) -> None:
+        """Receive datagrams until the socket would block, then add them as a batch."""
+        batch: list[IncomingEntry] = []
         while True:
             try:
-                many = self.sock.sctp_recv(5000)
-                logger.info(str(many))
+                many = self.sock.sctp_recv(MAX_FRAME_SIZE)
+                logger.debug("SCTP frame: %r", many)
 
                 _, _, data, _ = many
                 recv = data.decode("utf-8")
-
-                # Parse and process message
-                d = json.loads(recv)
-                logger.info(recv)
-                await self.add_message(d["user"], d["platform"], d["message"])
             except BlockingIOError:
-                await asyncio.sleep(0.1)
+                break
 
             except (ConnectionResetError, ConnectionAbortedError):
                 # Network/socket errors - usually safe to continue
                 logger.exception("SCTP Connection error.")
+                metrics.SCTP_ERRORS.inc("connection")
                 continue
 
-            except (UnicodeDecodeError, json.JSONDecodeError):
+            except UnicodeDecodeError:
                 # Data parsing errors - skip bad messages
                 logger.exception("Data parsing error.")
+                metrics.SCTP_ERRORS.inc("decode")
                 continue
 
-            except (asyncio.CancelledError, OSError):
-                # Proper asyncio cleanup
-                break
+            batch.extend(self._parse_frame(recv))
 
-            except KeyboardInterrupt:
-                # User interruption
-                break
+        if batch:
+            await self.add_messages(batch)
+
+    @staticmethod
+    def _parse_frame(recv: str) -> list[IncomingEntry]:
+        """Parse the messages in one frame.
+
+        A frame holds one JSON document, possibly pretty-printed, or
+        newline-delimited JSON messages. Each message has user, platform
+        and message keys, and an optional id used to drop retransmitted
+        duplicates.
+        """
+        try:
+            documents = [(recv, json.loads(recv))]
+        except json.JSONDecodeError:
+            # Not a single document, so one message per line
+            documents = []
+            for line in recv.splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    documents.append((line, json.loads(line)))
+                except json.JSONDecodeError:
+                    # Data parsing errors - skip bad messages
+                    logger.exception("Data parsing error.")
+                    metrics.SCTP_ERRORS.inc("parse")
+
+        entries = []
+        for raw, d in documents:
+            try:
+                entries.append(
+                    (d["user"], d["platform"], d["message"], d.get("id")),
+                )
+            except (KeyError, TypeError, AttributeError):
+                # Data parsing errors - skip bad messages
+                logger.exception("Data parsing error.")
+                metrics.SCTP_ERRORS.inc("parse")
+                continue
+            message_logger.info("Received SCTP message: %s", raw)
+
+        return entries
+
+    async def _add_each(self, entries: list[IncomingEntry]) -> None:
+        """Fallback batch callback adding messages one at a time."""
+        for user, platform, content, msg_id in entries:
+            await self.add_message(user, platform, content, msg_id=msg_id)
 
-    def stop(self) -> None:
+    async def stop(self) -> None:
         """Stop the SCTP bridge."""
-        self.sock.close()
+        if self.sock is not None:
+            self.sock.close()
@@ -0,0 +1,66 @@
+"""Tests for merging relayed lines into Discord-sized messages."""
+
+from discord_bridge import MAX_MESSAGE_LENGTH, DiscordBridge
+from message_buffer import Message
+
+
+async def _noop(*args: object) -> None:
+    pass
+
+
+def _message(seq: int, content: str) -> Message:
+    return Message(
+        seq=seq,
+        timestamp=float(seq),
+        sender="s",
+        platform="g",
+        content=content,
+    )
+
+
+# "**[g]** s: " before the content of every line
+PREFIX_LENGTH = len("**[g]** s: ")
+
+
+def test_short_lines_share_one_message() -> None:
+    bridge = DiscordBridge(_noop)
+    chunks = bridge._coalesce([_message(1, "one"), _message(2, "two")])
+
+    assert chunks == [("**[g]** s: one\n**[g]** s: two", 2)]
+
+
+def test_lines_filling_exactly_the_limit_stay_together() -> None:
+    bridge = DiscordBridge(_noop)
+    # Two lines plus the joining newline are exactly MAX_MESSAGE_LENGTH
+    first = "a" * (1000 - PREFIX_LENGTH)
+    second = "b" * (999 - PREFIX_LENGTH)
+    chunks = bridge._coalesce([_message(1, first), _message(2, second)])
+
+    assert len(chunks) == 1
+    assert len(chunks[0][0]) == MAX_MESSAGE_LENGTH
+    assert chunks[0][1] == 2
+
+
+def test_line_past_the_limit_starts_a_new_message() -> None:
+    bridge = DiscordBridge(_noop)
+    first = "a" * (1000 - PREFIX_LENGTH)
+    second = "b" * (1000 - PREFIX_LENGTH)
+    chunks = bridge._coalesce([_message(1, first), _message(2, second)])
+
+    assert [len(text) for text, _ in chunks] == [1000, 1000]
+    assert [completed for _, completed in chunks] == [1, 1]
+
+
+def test_long_line_is_split_into_full_chunks() -> None:
+    bridge = DiscordBridge(_noop)
+    line = "x" * (2 * MAX_MESSAGE_LENGTH + 10 - PREFIX_LENGTH)
+    chunks = bridge._coalesce([_message(1, line), _message(2, "after")])
+
+    assert [len(text) for text, _ in chunks] == [
+        MAX_MESSAGE_LENGTH,
+        MAX_MESSAGE_LENGTH,
+        10 + 1 + PREFIX_LENGTH + len("after"),
+    ]
+    # Each message counts as delivered with the chunk holding its last line
+    assert [completed for _, completed in chunks] == [0, 0, 2]
+    assert "".join(text for text, _ in chunks).startswith("**[g]** s: x")
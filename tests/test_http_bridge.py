@@ -0,0 +1,107 @@
+"""Tests for the GET /messages endpoint and its ETags."""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from http_bridge import HTTPBridge
+from message_buffer import MessageBuffer
+
+
+async def _noop(*args: object) -> None:
+    pass
+
+
+@pytest.fixture
+def buffer() -> MessageBuffer:
+    return MessageBuffer(max_size=10)
+
+
+@pytest.fixture
+def client(buffer: MessageBuffer) -> TestClient:
+    return TestClient(HTTPBridge(_noop, buffer=buffer).app)
+
+
+@pytest.mark.parametrize("wait", ["nan", "inf", "-inf"])
+def test_non_finite_wait_does_not_hold_the_request(
+    client: TestClient,
+    wait: str,
+) -> None:
+    response = client.get("/messages", params={"after": 3, "wait": wait})
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_page_is_the_buffered_json_with_cursor_and_etag(
+    client: TestClient,
+    buffer: MessageBuffer,
+) -> None:
+    first = buffer.add_message("alice", "survival", 'say "hi"')
+    second = buffer.add_message("bob", "creative", "hello")
+
+    response = client.get("/messages", params={"after": 0})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["x-message-cursor"] == "2"
+    assert response.headers["etag"].startswith('"')
+    assert response.json() == [first, second]
+    # Joined from the bytes serialized when the messages were buffered
+    encoded = [json.dumps(msg).encode() for msg in (first, second)]
+    assert response.content == b"[" + b",".join(encoded) + b"]"
+
+
+def test_unchanged_poll_gets_not_modified(
+    client: TestClient,
+    buffer: MessageBuffer,
+) -> None:
+    buffer.add_message("alice", "survival", "hi")
+    etag = client.get("/messages", params={"after": 0}).headers["etag"]
+
+    response = client.get(
+        "/messages",
+        params={"after": 0},
+        headers={"If-None-Match": f'"other", {etag}'},
+    )
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+
+def test_new_message_changes_the_etag(
+    client: TestClient,
+    buffer: MessageBuffer,
+) -> None:
+    buffer.add_message("alice", "survival", "hi")
+    etag = client.get("/messages", params={"after": 0}).headers["etag"]
+    buffer.add_message("bob", "survival", "hello")
+
+    response = client.get(
+        "/messages",
+        params={"after": 0},
+        headers={"If-None-Match": etag},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()) == 2
+
+
+def test_etag_depends_on_the_query(
+    client: TestClient,
+    buffer: MessageBuffer,
+) -> None:
+    buffer.add_message("alice", "survival", "hi")
+    etag = client.get("/messages", params={"after": 0}).headers["etag"]
+
+    response = client.get(
+        "/messages",
+        params={"after": 0, "exclude": "survival"},
+        headers={"If-None-Match": etag},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == []
@@ -0,0 +1,82 @@
+"""Tests for ingress deduplication in the relay."""
+
+import asyncio
+from collections.abc import Coroutine, Iterator
+from typing import Any
+
+import pytest
+
+import config
+from main_relay import ChatRelay
+from message_buffer import message_buffer
+
+
+@pytest.fixture
+def relay(monkeypatch: pytest.MonkeyPatch) -> Iterator[ChatRelay]:
+    # No bridges and no rate limits, only dedup decides what is buffered
+    monkeypatch.setattr(config, "HTTP_ENABLED", False)
+    monkeypatch.setattr(config, "SCTP_ENABLED", False)
+    monkeypatch.setattr(config, "INGRESS_SENDER_RATE", 0.0)
+    monkeypatch.setattr(config, "INGRESS_SOURCE_RATE", 0.0)
+    relay = ChatRelay()
+    yield relay
+    asyncio.run(relay.stop())
+
+
+def _buffered(run: Coroutine[Any, Any, None]) -> list[str]:
+    """Contents buffered while running a coroutine."""
+    start = message_buffer.last_seq
+    asyncio.run(run)
+    return [msg["content"] for msg in message_buffer.get_messages_after(start)]
+
+
+def test_retried_message_is_buffered_once(relay: ChatRelay) -> None:
+    async def run() -> None:
+        await relay.add_message("s", "game", "hello", msg_id="1")
+        await relay.add_message("s", "game", "hello", msg_id="1")
+        await relay.add_message("s", "game", "again")
+        await relay.add_message("s", "game", "again")
+
+    # Messages without an ID are never treated as duplicates
+    assert _buffered(run()) == ["hello", "again", "again"]
+
+
+def test_ids_are_scoped_to_the_platform(relay: ChatRelay) -> None:
+    async def run() -> None:
+        await relay.add_message("s", "survival", "hello", msg_id="1")
+        await relay.add_message("s", "creative", "hello", msg_id="1")
+
+    assert _buffered(run()) == ["hello", "hello"]
+
+
+def test_batch_drops_duplicates_within_and_across_batches(
+    relay: ChatRelay,
+) -> None:
+    async def run() -> None:
+        await relay.add_messages(
+            [("s", "game", "one", "1"), ("s", "game", "two", "2")],
+        )
+        await relay.add_messages(
+            [
+                ("s", "game", "two", "2"),
+                ("s", "game", "three", "3"),
+                ("s", "game", "three", "3"),
+            ],
+        )
+
+    assert _buffered(run()) == ["one", "two", "three"]
+
+
+def test_ids_expire_after_the_window(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "HTTP_ENABLED", False)
+    monkeypatch.setattr(config, "SCTP_ENABLED", False)
+    monkeypatch.setattr(config, "DEDUP_WINDOW_SECONDS", 0.01)
+    relay = ChatRelay()
+
+    async def run() -> None:
+        await relay.add_message("s", "game", "hello", msg_id="1")
+        await asyncio.sleep(0.02)
+        await relay.add_message("s", "game", "hello", msg_id="1")
+        await relay.stop()
+
+    assert _buffered(run()) == ["hello", "hello"]
@@ -0,0 +1,158 @@
+"""Tests for the message broker used by HTTP workers."""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+import metrics
+from message_broker import MessageBroker, RemoteMessageBuffer
+from message_buffer import IncomingEntry, MessageBuffer
+
+
+async def _noop(*args: object) -> None:
+    pass
+
+
+def _with_broker(
+    tmp_path: Path,
+    buffer: MessageBuffer,
+    test: Callable[[RemoteMessageBuffer], Awaitable[None]],
+    received: list | None = None,
+) -> None:
+    """Run a test against a broker serving buffer on a temporary socket."""
+
+    async def add_message(*args: object) -> None:
+        if received is not None:
+            received.append(args)
+
+    async def add_messages(entries: list[IncomingEntry]) -> None:
+        if received is not None:
+            received.extend(tuple(entry) for entry in entries)
+
+    async def run() -> None:
+        path = str(tmp_path / "broker.sock")
+        broker = MessageBroker(path, buffer, add_message, add_messages)
+        await broker.start()
+        try:
+            await test(RemoteMessageBuffer(path))
+        finally:
+            await broker.stop()
+
+    asyncio.run(run())
+
+
+def test_page_body_is_sent_as_raw_bytes(tmp_path: Path) -> None:
+    buffer = MessageBuffer(max_size=10)
+    # Quotes, newlines and non-ASCII would all be escaped in a JSON string
+    buffer.add_message('a "quoted" name', "game", 'line\nwith "quotes" é')
+    buffer.add_message("bob", "other", "hello\n")
+    expected = asyncio.run(buffer.wait_for_page_after(0, 0))
+
+    async def test(remote: RemoteMessageBuffer) -> None:
+        page = await remote.wait_for_page_after(0, 0)
+        assert page == expected
+        assert isinstance(page.body, bytes)
+
+        # Frames and lines interleave correctly on one connection
+        pages = await asyncio.gather(
+            remote.wait_for_page_after(1, 0),
+            remote.wait_for_messages_after(0, 0, exclude="game"),
+            remote.wait_for_page_since(0, 0, exclude="other"),
+        )
+        assert pages[0].count == 1
+        assert pages[0].cursor == 2
+        assert [msg["sender"] for msg in pages[1]] == ["bob"]
+        assert pages[2].count == 1
+
+    _with_broker(tmp_path, buffer, test)
+
+
+def test_empty_page_keeps_the_cursor(tmp_path: Path) -> None:
+    buffer = MessageBuffer(max_size=10)
+    buffer.add_message("alice", "game", "hi")
+
+    async def test(remote: RemoteMessageBuffer) -> None:
+        page = await remote.wait_for_page_after(1, 0)
+        assert (page.body, page.count, page.cursor) == (b"[]", 0, 1)
+        assert page.version == buffer.version
+
+    _with_broker(tmp_path, buffer, test)
+
+
+def test_ingress_is_forwarded(tmp_path: Path) -> None:
+    received: list = []
+
+    async def test(remote: RemoteMessageBuffer) -> None:
+        await remote.add_message("alice", "game", "hi", msg_id="1")
+        await remote.add_messages([("bob", "game", "hello", None)])
+
+    _with_broker(tmp_path, MessageBuffer(), test, received)
+    assert received == [
+        ("alice", "game", "hi", None, "1"),
+        ("bob", "game", "hello", None),
+    ]
+
+
+def test_version_is_forgotten_when_the_broker_goes_away(tmp_path: Path) -> None:
+    buffer = MessageBuffer()
+    buffer.add_message("alice", "game", "hi")
+
+    async def run() -> None:
+        path = str(tmp_path / "broker.sock")
+        broker = MessageBroker(path, buffer, _noop, _noop)
+        await broker.start()
+        remote = RemoteMessageBuffer(path)
+        await remote.wait_for_messages_after(0, 0)
+        async with asyncio.timeout(1.0):
+            while remote.version != buffer.version:
+                await asyncio.sleep(0.01)
+
+        await broker.stop()
+        # No stale version left to answer 304s from
+        async with asyncio.timeout(1.0):
+            while remote.version:
+                await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+
+
+def test_worker_metrics_are_merged_into_the_relay(tmp_path: Path) -> None:
+    before = dict(metrics.POLLS._values)
+    metrics.POLLS._values.clear()
+
+    async def test(remote: RemoteMessageBuffer) -> None:
+        # Drained before the scrape and merged by the broker, which shares
+        # this process's registry here
+        metrics.POLLS.inc(amount=3)
+        text = await remote.render_metrics()
+        assert "relay_polls_total 3.0" in text
+
+    try:
+        _with_broker(tmp_path, MessageBuffer(), test)
+    finally:
+        metrics.POLLS._values.clear()
+        metrics.POLLS._values.update(before)
+
+
+def test_drained_samples_merge_into_another_registry() -> None:
+    histogram = metrics.Histogram("test_seconds", "Test", buckets=(0.1, 1.0))
+    counter = metrics.Counter("test_total", "Test", ("kind",))
+    try:
+        histogram.observe(0.05)
+        histogram.observe(5.0)
+        counter.inc("a", amount=2)
+        samples = {
+            "test_seconds": histogram.drain(),
+            "test_total": counter.drain(),
+        }
+        assert histogram.render()[2:] == []
+        assert counter.render()[2:] == []
+
+        metrics.merge(samples)
+        metrics.merge(samples)
+        assert counter.render()[2:] == ['test_total{kind="a"} 4.0']
+        assert 'test_seconds_bucket{le="0.1"} 2' in histogram.render()
+        assert "test_seconds_count 4" in histogram.render()
+    finally:
+        metrics.unregister(histogram)
+        metrics.unregister(counter)
@@ -0,0 +1,122 @@
+"""Tests for the message ring and the per-channel buffer queries."""
+
+import pytest
+
+from message_buffer import Message, MessageBuffer, MessageRing
+
+
+def _message(seq: int, platform: str = "game") -> Message:
+    return Message(
+        seq=seq,
+        timestamp=float(seq),
+        sender="sender",
+        platform=platform,
+        content=f"message {seq}",
+    )
+
+
+def _ring(max_size: int, seqs: range) -> MessageRing:
+    ring = MessageRing(max_size)
+    for seq in seqs:
+        ring.append(_message(seq), (seq, b"%d" % seq))
+    return ring
+
+
+def _seqs(messages: list[Message]) -> list[int]:
+    return [msg["seq"] for msg in messages]
+
+
+def test_ring_grows_until_full() -> None:
+    ring = _ring(5, range(1, 4))
+
+    assert len(ring) == 3
+    assert _seqs(list(ring)) == [1, 2, 3]
+    assert ring.last_seq == 3
+
+
+def test_ring_wraps_around_oldest_first() -> None:
+    ring = _ring(3, range(1, 8))
+
+    assert len(ring) == 3
+    assert _seqs(list(ring)) == [5, 6, 7]
+    assert ring.encoded(0) == (5, b"5")
+    assert ring.encoded(2) == (7, b"7")
+
+
+def test_ring_after_bisects_across_the_wrap() -> None:
+    # Capacity 4 after 6 appends: the oldest slot is in the middle of the list
+    ring = _ring(4, range(1, 7))
+
+    assert _seqs(ring.after(0)) == [3, 4, 5, 6]
+    assert _seqs(ring.after(2)) == [3, 4, 5, 6]
+    assert _seqs(ring.after(4)) == [5, 6]
+    assert ring.after(6) == []
+    assert ring.encoded_after(5) == [(6, b"6")]
+
+
+def test_ring_index_out_of_range() -> None:
+    ring = _ring(3, range(1, 3))
+
+    with pytest.raises(IndexError):
+        ring[2]
+
+
+def test_buffer_cursor_after_eviction_and_restart() -> None:
+    buffer = MessageBuffer(max_size=3)
+    for i in range(5):
+        buffer.add_message("sender", "game", f"message {i}")
+
+    assert buffer.last_seq == 5
+    assert _seqs(buffer.get_messages_after(0)) == [3, 4, 5]
+    assert _seqs(buffer.get_messages_after(4)) == [5]
+    assert buffer.get_messages_after(5) == []
+    # A cursor from a previous run is ahead of this buffer
+    assert _seqs(buffer.get_messages_after(99)) == [3, 4, 5]
+
+
+def test_exclude_merges_channels_in_seq_order() -> None:
+    buffer = MessageBuffer(max_size=10, channel_size=10)
+    for platform in ["a", "b", "a", "c", "b", "a", "c"]:
+        buffer.add_message("sender", platform, "hello")
+
+    assert _seqs(buffer.get_messages_after(0, exclude="c")) == [1, 2, 3, 5, 6]
+    assert _seqs(buffer.get_messages_after(2, exclude="a")) == [4, 5, 7]
+    assert [seq for seq, _ in buffer.get_encoded_after(0, exclude="b")] == [
+        1,
+        3,
+        4,
+        6,
+        7,
+    ]
+
+
+def test_exclude_keeps_quiet_channel_history() -> None:
+    buffer = MessageBuffer(max_size=3, channel_size=3)
+    buffer.add_message("sender", "quiet", "still here")
+    for _ in range(5):
+        buffer.add_message("sender", "busy", "hello")
+
+    # Evicted from the global ring, but not from its own channel ring
+    assert _seqs(buffer.get_messages_after(0)) == [4, 5, 6]
+    assert _seqs(buffer.get_messages_after(0, exclude="other")) == [1, 4, 5, 6]
+    assert _seqs(buffer.get_messages_after(0, exclude="busy")) == [1]
+
+
+def test_channel_query() -> None:
+    buffer = MessageBuffer(max_size=10, channel_size=10)
+    for platform in ["a", "b", "a"]:
+        buffer.add_message("sender", platform, "hello")
+
+    assert _seqs(buffer.get_messages_after(0, channel="a")) == [1, 3]
+    assert buffer.get_messages_after(0, channel="a", exclude="a") == []
+    assert buffer.get_messages_after(0, channel="missing") == []
+
+
+def test_least_recently_active_channel_is_dropped() -> None:
+    buffer = MessageBuffer(max_size=10, channel_size=10, max_channels=2)
+    for platform in ["a", "b", "a", "c"]:
+        buffer.add_message("sender", platform, "hello")
+
+    assert buffer.get_messages_after(0, channel="b") == []
+    assert _seqs(buffer.get_messages_after(0, channel="a")) == [1, 3]
+    assert _seqs(buffer.get_messages_after(0, channel="c")) == [4]
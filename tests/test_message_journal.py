@@ -0,0 +1,86 @@
+"""Tests for journal replay and compaction."""
+
+from pathlib import Path
+
+from message_journal import SEGMENT_SUFFIX, MessageJournal
+
+
+def _messages(seqs: range) -> list[dict]:
+    return [
+        {
+            "seq": seq,
+            "timestamp": float(seq),
+            "sender": "sender",
+            "platform": "game",
+            "content": f"message {seq}",
+        }
+        for seq in seqs
+    ]
+
+
+def _segments(path: Path) -> list[Path]:
+    return sorted(path.glob(f"*{SEGMENT_SUFFIX}"))
+
+
+def test_replay_round_trip(tmp_path: Path) -> None:
+    journal = MessageJournal(str(tmp_path), keep=10)
+    journal.replay()
+    journal.append(_messages(range(1, 4)))
+    journal.append(_messages(range(4, 6)))
+    journal.close()
+
+    replayed = MessageJournal(str(tmp_path), keep=10)
+    assert [msg["seq"] for msg in replayed.replay()] == [1, 2, 3, 4, 5]
+    replayed.close()
+
+
+def test_replay_skips_torn_write(tmp_path: Path) -> None:
+    journal = MessageJournal(str(tmp_path), keep=10)
+    journal.replay()
+    journal.append(_messages(range(1, 4)))
+    journal.close()
+
+    # A crash in the middle of a write leaves a partial last line
+    (segment,) = _segments(tmp_path)
+    with segment.open("ab") as f:
+        f.write(b'{"seq": 4, "timestamp": 4.0, "sen')
+
+    replayed = MessageJournal(str(tmp_path), keep=10)
+    assert [msg["seq"] for msg in replayed.replay()] == [1, 2, 3]
+    replayed.append(_messages(range(4, 5)))
+    replayed.close()
+
+    # The torn record was compacted away, new writes start on a clean line
+    again = MessageJournal(str(tmp_path), keep=10)
+    assert [msg["seq"] for msg in again.replay()] == [1, 2, 3, 4]
+    again.close()
+
+
+def test_replay_keeps_newest_across_segments(tmp_path: Path) -> None:
+    journal = MessageJournal(str(tmp_path), keep=4, segment_bytes=200)
+    journal.replay()
+    for seq in range(1, 21):
+        journal.append(_messages(range(seq, seq + 1)))
+    journal.close()
+
+    assert len(_segments(tmp_path)) > 1
+    replayed = MessageJournal(str(tmp_path), keep=4)
+    assert [msg["seq"] for msg in replayed.replay()] == [17, 18, 19, 20]
+    replayed.close()
+    assert len(_segments(tmp_path)) == 1
+
+
+def test_replay_skips_tail_copied_by_interrupted_compaction(tmp_path: Path) -> None:
+    journal = MessageJournal(str(tmp_path), keep=10)
+    journal.replay()
+    journal.append(_messages(range(1, 4)))
+    journal.close()
+
+    # A crash after the tail was rewritten, before the old segment was deleted
+    (segment,) = _segments(tmp_path)
+    copy = tmp_path / f"{int(segment.stem) + 1:08d}{SEGMENT_SUFFIX}"
+    copy.write_bytes(segment.read_bytes())
+
+    replayed = MessageJournal(str(tmp_path), keep=10)
+    assert [msg["seq"] for msg in replayed.replay()] == [1, 2, 3]
+    replayed.close()
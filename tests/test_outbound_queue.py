@@ -0,0 +1,152 @@
+"""Tests for ordered delivery and retries in the outbound queue."""
+
+import asyncio
+import sqlite3
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+import config
+from message_buffer import Message
+from outbound_queue import OutboundQueue
+
+
+def _message(seq: int) -> Message:
+    return Message(
+        seq=seq,
+        timestamp=float(seq),
+        sender="sender",
+        platform="game",
+        content=f"message {seq}",
+    )
+
+
+async def _until(condition: Callable[[], bool], timeout: float = 2.0) -> None:
+    """Let the worker run until the condition holds."""
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.001)
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "OUTBOX_RETRY_BASE", 0.0)
+
+
+def test_delivers_in_order_retrying_the_head() -> None:
+    sent: list[str] = []
+    failures = iter([True, False, True])
+
+    async def post_message(sender: str, platform: str, content: str) -> bool:
+        ok = next(failures, True)
+        if ok:
+            sent.append(content)
+        return ok
+
+    async def run() -> None:
+        queue = OutboundQueue("test", post_message, db_path="")
+        queue.start()
+        for seq in range(1, 5):
+            queue.put(_message(seq))
+        await _until(lambda: queue.depth == 0)
+        await queue.stop()
+
+    asyncio.run(run())
+    assert sent == ["message 1", "message 2", "message 3", "message 4"]
+
+
+def test_full_queue_drops_oldest() -> None:
+    async def post_message(sender: str, platform: str, content: str) -> bool:
+        return True
+
+    async def run() -> list[int]:
+        queue = OutboundQueue("test", post_message, max_size=3, db_path="")
+        for seq in range(1, 6):
+            queue.put(_message(seq))
+        return [message["seq"] for _, message in queue._pending]
+
+    assert asyncio.run(run()) == [3, 4, 5]
+
+
+def test_undelivered_messages_survive_a_restart(tmp_path: Path) -> None:
+    db_path = str(tmp_path / "outbox.sqlite")
+
+    async def failing(sender: str, platform: str, content: str) -> bool:
+        return False
+
+    async def first_run() -> None:
+        queue = OutboundQueue("test", failing, db_path=db_path)
+        for seq in range(1, 4):
+            queue.put(_message(seq))
+        await queue.stop()
+
+    async def second_run() -> list[int]:
+        queue = OutboundQueue("test", failing, db_path=db_path)
+        seqs = [message["seq"] for _, message in queue._pending]
+        await queue.stop()
+        return seqs
+
+    asyncio.run(first_run())
+    assert asyncio.run(second_run()) == [1, 2, 3]
+
+
+def test_partial_batch_resends_only_the_rest() -> None:
+    batches: list[list[int]] = []
+    results = iter([1, 0])
+
+    async def post_messages(messages: list[Message]) -> int:
+        batches.append([message["seq"] for message in messages])
+        return next(results, len(messages))
+
+    async def post_message(sender: str, platform: str, content: str) -> bool:
+        raise AssertionError("batch bridges are sent batches")
+
+    async def run() -> None:
+        queue = OutboundQueue("test", post_message, post_messages, db_path="")
+        for seq in range(1, 4):
+            queue.put(_message(seq))
+        queue.start()
+        await _until(lambda: queue.depth == 0)
+        await queue.stop()
+
+    asyncio.run(run())
+    assert batches == [[1, 2, 3], [2, 3], [2, 3]]
+
+
+def test_message_failing_every_attempt_is_dead_lettered(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(config, "OUTBOX_MAX_ATTEMPTS", 3)
+    db_path = str(tmp_path / "outbox.sqlite")
+    sent: list[str] = []
+    attempts = 0
+
+    async def post_message(sender: str, platform: str, content: str) -> bool:
+        nonlocal attempts
+        if content == "message 1":
+            attempts += 1
+            return False
+        sent.append(content)
+        return True
+
+    async def run() -> None:
+        queue = OutboundQueue("test", post_message, db_path=db_path)
+        queue.start()
+        for seq in range(1, 4):
+            queue.put(_message(seq))
+        await _until(lambda: queue.depth == 0)
+        await queue.stop()
+
+    asyncio.run(run())
+    assert attempts == 3
+    assert sent == ["message 2", "message 3"]
+
+    db = sqlite3.connect(db_path)
+    assert db.execute("SELECT COUNT(*) FROM outbox").fetchone() == (0,)
+    dead = db.execute("SELECT destination, message FROM dead_letter").fetchall()
+    db.close()
+    assert [(label, '"seq": 1' in message) for label, message in dead] == [
+        ("test", True),
+    ]
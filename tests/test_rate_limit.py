@@ -0,0 +1,115 @@
+"""Tests for the ingress limiter policies."""
+
+import asyncio
+
+import pytest
+
+import config
+from rate_limit import IngressLimiter, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def _limits(monkeypatch: pytest.MonkeyPatch) -> None:
+    # One message at once per sender, then one every 10 ms
+    monkeypatch.setattr(config, "INGRESS_SENDER_RATE", 100.0)
+    monkeypatch.setattr(config, "INGRESS_SENDER_BURST", 1)
+    monkeypatch.setattr(config, "INGRESS_SOURCE_RATE", 0.0)
+    monkeypatch.setattr(config, "INGRESS_MAX_DELAY", 1.0)
+
+
+def _run(policy: str, lines: list[str]) -> tuple[list[str], list[str], dict]:
+    """Admit lines from one sender, returning those admitted and emitted."""
+    emitted: list[str] = []
+
+    async def emit(
+        sender: str,
+        platform: str,
+        content: str,
+        channel: str | None,
+    ) -> None:
+        emitted.append(content)
+
+    async def run() -> tuple[list[str], IngressLimiter]:
+        limiter = IngressLimiter(emit, policy)
+        admitted = [line for line in lines if limiter.admit("s", "game", line)]
+        async with asyncio.timeout(2.0):
+            while limiter._pending:
+                await asyncio.sleep(0.005)
+        return admitted, limiter
+
+    admitted, limiter = asyncio.run(run())
+    return admitted, emitted, dict(limiter.shed)
+
+
+def test_token_bucket_refills_at_rate() -> None:
+    bucket = TokenBucket(rate=10.0, capacity=2)
+
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert 0.0 < bucket.time_until() <= 0.1
+
+
+def test_drop_discards_limited_messages() -> None:
+    admitted, emitted, shed = _run("drop", ["a", "b", "c"])
+
+    assert admitted == ["a"]
+    assert emitted == []
+    assert shed == {("game", "dropped"): 2}
+
+
+def test_delay_emits_limited_messages_in_order() -> None:
+    admitted, emitted, shed = _run("delay", ["a", "b", "c", "d"])
+
+    assert admitted == ["a"]
+    assert emitted == ["b", "c", "d"]
+    assert shed == {}
+
+
+def test_delay_drops_past_the_maximum_delay(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "INGRESS_MAX_DELAY", 0.025)
+    admitted, emitted, shed = _run("delay", ["a", "b", "c", "d", "e"])
+
+    # Two queued messages fit in 25 ms at 10 ms each, later ones do not
+    assert admitted == ["a"]
+    assert emitted == ["b", "c"]
+    assert shed == {("game", "dropped"): 2}
+
+
+def test_collapse_folds_repeats_and_queues_other_lines() -> None:
+    admitted, emitted, shed = _run("collapse", ["a", "b", "b", "b", "c", "b"])
+
+    assert admitted == ["a"]
+    assert emitted == ["b (x3)", "c", "b"]
+    # Only the folded repeats were shed, every line was delivered
+    assert shed == {("game", "collapsed"): 2}
+
+
+def test_collapse_drops_past_the_pending_limit(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(config, "INGRESS_MAX_PENDING", 2)
+    admitted, emitted, shed = _run("collapse", ["a", "b", "c", "d"])
+
+    assert emitted == ["b", "c"]
+    assert shed == {("game", "dropped"): 1}
+
+
+def test_shed_platform_labels_are_bounded(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "INGRESS_MAX_PLATFORM_LABELS", 2)
+    monkeypatch.setattr(config, "INGRESS_SENDER_BURST", 0)
+
+    async def emit(*args: object) -> None:
+        pass
+
+    async def run() -> dict:
+        limiter = IngressLimiter(emit, "drop")
+        for platform in ["a", "b", "c", "d", "a"]:
+            limiter.admit("s", platform, "hi")
+        return dict(limiter.shed)
+
+    assert asyncio.run(run()) == {
+        ("a", "dropped"): 2,
+        ("b", "dropped"): 1,
+        ("other", "dropped"): 2,
+    }
@@ -0,0 +1,76 @@
+"""Tests for route compilation and destination lookup."""
+
+import pytest
+
+import config
+from routing import RoutingTable
+
+
+def test_destination_falls_back_to_platform_then_wildcard() -> None:
+    table = RoutingTable(
+        [
+            {"platform": "discord", "channel": "1", "to": ["matrix"]},
+            {"platform": "survival", "to": ["discord"]},
+            {"platform": "*", "to": ["discord", "matrix"]},
+        ],
+    )
+
+    assert table.destinations("discord", "1", "hi") == {"matrix"}
+    assert table.destinations("survival", None, "hi") == {"discord"}
+    assert table.destinations("creative", None, "hi") == {"discord", "matrix"}
+    # Unrouted chat channel falls through to the global wildcard
+    assert table.destinations("discord", "2", "hi") == {"discord", "matrix"}
+
+
+def test_empty_route_drops_instead_of_falling_back() -> None:
+    table = RoutingTable(
+        [
+            {"platform": "survival", "to": []},
+            {"platform": "*", "to": ["discord"]},
+        ],
+    )
+
+    assert table.destinations("survival", None, "hi") == frozenset()
+
+
+def test_match_adds_destinations() -> None:
+    table = RoutingTable(
+        [
+            {"platform": "survival", "to": ["matrix"]},
+            {"platform": "survival", "match": "^!", "to": ["discord"]},
+        ],
+    )
+
+    assert table.destinations("survival", None, "!alert") == {"discord", "matrix"}
+    assert table.destinations("survival", None, "hello") == {"matrix"}
+
+
+def test_only_explicit_channels_are_inputs() -> None:
+    table = RoutingTable(
+        [
+            {"platform": "discord", "channel": "1", "to": []},
+            {"platform": "matrix", "to": ["discord"]},
+            {"platform": "*", "to": ["discord"]},
+        ],
+    )
+
+    assert table.is_input("discord", "1")
+    assert not table.is_input("discord", "2")
+    assert not table.is_input("matrix", "!room")
+    assert table.input_channels("discord") == ["1"]
+
+
+def test_default_routes_drop_spoofed_chat_platforms(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(config, "ROUTES", [])
+    monkeypatch.setattr(config, "DISCORD_INPUT_CHANNELS", ["1"])
+    monkeypatch.setattr(config, "MATRIX_INPUT_CHANNELS", ["!room"])
+    table = RoutingTable.from_config()
+
+    assert table.destinations("survival", None, "hi") == {"discord", "matrix"}
+    assert table.destinations("discord", "1", "hi") == frozenset()
+    # A game server posting as a chat platform is not relayed
+    assert table.destinations("discord", None, "hi") == frozenset()
+    assert table.destinations("matrix", None, "hi") == frozenset()
+    assert table.is_input("matrix", "!room")
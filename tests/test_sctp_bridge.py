@@ -0,0 +1,35 @@
+"""Tests for parsing SCTP frames."""
+
+import json
+
+import pytest
+
+pytest.importorskip("sctp")
+
+from sctp_bridge import SCTPBridge  # noqa: E402
+
+
+def test_pretty_printed_document_is_one_message() -> None:
+    frame = json.dumps(
+        {"user": "alice", "platform": "survival", "message": "hi"},
+        indent=2,
+    )
+
+    assert SCTPBridge._parse_frame(frame) == [("alice", "survival", "hi", None)]
+
+
+def test_newline_delimited_messages() -> None:
+    frame = "\n".join(
+        [
+            json.dumps({"user": "a", "platform": "p", "message": "1", "id": "x"}),
+            "",
+            "not json",
+            json.dumps({"user": "b", "platform": "p"}),
+            json.dumps({"user": "c", "platform": "p", "message": "3"}),
+        ],
+    )
+
+    assert SCTPBridge._parse_frame(frame) == [
+        ("a", "p", "1", "x"),
+        ("c", "p", "3", None),
+    ]
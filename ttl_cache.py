@@ -0,0 +1,57 @@
+"""Bounded LRU cache with per-entry expiry."""
+
+import time
+from collections import OrderedDict
+from typing import Generic, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """LRU cache whose entries also expire after a fixed time to live."""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_size: Maximum number of entries before the least recently
+                used is evicted
+            ttl: Seconds an entry stays valid after it was set
+
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> V | None:
+        """Get a cached value, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        """Cache a value, evicting the least recently used entry if full."""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        """Invalidate a cached value."""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Invalidate every cached value."""
+        self._entries.clear()